@@ -0,0 +1,585 @@
+#!/usr/bin/env python3
+"""
+SHEIN Monitor Benchmark
+Runs the monitor against local stand-ins for the wishlist API and the
+Telegram Bot API, so performance can be measured without cookies or a bot.
+
+    python3 benchmark_monitor.py --products 300 --latency 0.08 --scans 30
+
+With --replay it instead feeds a capture recorded by the monitor
+(CAPTURE_FILE) back through extraction, diff and notifications:
+
+    python3 benchmark_monitor.py --replay capture.bin.gz --speed 60 --multiply 500
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import random
+import re
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# ============================================
+# FAKE SHEIN WISHLIST API
+# ============================================
+
+SIZES = ('XS', 'S', 'M', 'L', 'XL')
+
+
+class FakeWishlist:
+    """In-memory wishlist served in getwishlist format"""
+
+    def __init__(self, products, sizes, in_stock_ratio, max_page_size, seed):
+        self.lock = threading.Lock()
+        self.random = random.Random(seed)
+        self.max_page_size = max_page_size
+        self.products = []
+        for i in range(products):
+            code = f"BM{i:06d}"
+            self.products.append({
+                'productCode': code,
+                'name': f"Benchmark Product {i}",
+                'url': f"/benchmark/p/{code}-x{i}.html",
+                'price': {'value': 299 + i % 700},
+                'sizes': {size: self.random.random() < in_stock_ratio for size in SIZES[:sizes]},
+            })
+        self.restocked_at = {}  # (code, size) -> time the restock was injected
+        self.restocks = 0  # restocks injected, a variant restocking twice counts twice
+
+    def restock(self, count):
+        """Flip `count` out-of-stock variants to in stock"""
+        with self.lock:
+            candidates = [
+                (product, size)
+                for product in self.products
+                for size, in_stock in product['sizes'].items()
+                if not in_stock
+            ]
+            now = time.time()
+            for product, size in self.random.sample(candidates, min(count, len(candidates))):
+                product['sizes'][size] = True
+                self.restocked_at[(product['productCode'], size)] = now
+                self.restocks += 1
+
+    def sell_out(self, count):
+        """Flip `count` in-stock variants to out of stock"""
+        with self.lock:
+            candidates = [
+                (product, size)
+                for product in self.products
+                for size, in_stock in product['sizes'].items()
+                if in_stock
+            ]
+            for product, size in self.random.sample(candidates, min(count, len(candidates))):
+                product['sizes'][size] = False
+
+    def page(self, page_num, page_size):
+        page_size = min(page_size, self.max_page_size)
+        with self.lock:
+            start = page_num * page_size
+            products = [
+                {
+                    'productCode': product['productCode'],
+                    'name': product['name'],
+                    'url': product['url'],
+                    'price': product['price'],
+                    'variantOptions': [
+                        {
+                            'stock': {'stockLevelStatus': 'inStock' if in_stock else 'outOfStock'},
+                            'variantOptionQualifiers': [{'qualifier': 'size', 'value': size}],
+                        }
+                        for size, in_stock in product['sizes'].items()
+                    ],
+                }
+                for product in self.products[start:start + page_size]
+            ]
+            total = len(self.products)
+        return {
+            'products': products,
+            'pagination': {
+                'currentPage': page_num,
+                'pageSize': page_size,
+                'totalPages': (total + page_size - 1) // page_size,
+                'totalResults': total,
+            },
+        }
+
+
+ALERT_ITEM_SPLIT = re.compile(r'━{3,}')  # the monitor's DIVIDER between alert items
+ALERT_SIZE = re.compile(r'Size: (\S+)')
+ALERT_CODE = re.compile(r'`([^`]+)`')
+
+
+def alert_items(text):
+    """Yield (code, size) for each item of an alert message, both taken from the same item"""
+    for block in ALERT_ITEM_SPLIT.split(text):
+        size, code = ALERT_SIZE.search(block), ALERT_CODE.search(block)
+        if size and code:
+            yield code.group(1), size.group(1)
+
+
+class StandInServer:
+    """One HTTP server playing both the wishlist API and the Telegram Bot API"""
+
+    def __init__(self, wishlist, latency, jitter, error_rate, seed, compress=False, etags=False):
+        self.wishlist = wishlist
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.compress = compress
+        self.etags = etags
+        self.random = random.Random(seed + 1)
+        self.lock = threading.Lock()
+        self.wishlist_requests = 0
+        self.wishlist_bytes = 0
+        self.telegram_requests = 0
+        self.alerted = set()  # (code, size, restocked_at) already counted
+        self.alerts = []  # (received_at, code, size, restocked_at), first alert per restock only
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+
+    def _handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return len(body)
+
+            def _reply_page(self, payload):
+                """Reply with a wishlist page, gzipped and/or revalidated when enabled"""
+                body = json.dumps(payload).encode()
+                etag = f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+                if stand_in.etags and self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return 0
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                if stand_in.etags:
+                    self.send_header('ETag', etag)
+                if stand_in.compress and 'gzip' in self.headers.get('Accept-Encoding', ''):
+                    body = gzip.compress(body, compresslevel=6)
+                    self.send_header('Content-Encoding', 'gzip')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return len(body)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+
+                if url.path.endswith('/getwishlist') and stand_in.wishlist is not None:
+                    with stand_in.lock:
+                        stand_in.wishlist_requests += 1
+                        fail = stand_in.random.random() < stand_in.error_rate
+                        delay = max(0.0, stand_in.latency + stand_in.random.uniform(-stand_in.jitter, stand_in.jitter))
+                    time.sleep(delay)
+                    if fail:
+                        self._reply(503, {'error': 'benchmark error'})
+                        return
+                    page_num = int(query.get('currentPage', ['0'])[0])
+                    page_size = int(query.get('pageSize', ['10'])[0])
+                    sent = self._reply_page(stand_in.wishlist.page(page_num, page_size))
+                    with stand_in.lock:
+                        stand_in.wishlist_bytes += sent
+                elif url.path.endswith('/getChat'):
+                    self._reply(200, {'ok': True, 'result': {'username': 'benchmark'}})
+                else:
+                    self._reply(404, {'ok': False})
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                received_at = time.time()
+                text = payload.get('text', '')
+                with stand_in.lock:
+                    stand_in.telegram_requests += 1
+                    restocked = stand_in.wishlist.restocked_at if stand_in.wishlist is not None else {}
+                    for code, size in alert_items(text):
+                        restocked_at = restocked.get((code, size))
+                        if restocked_at is None or (code, size, restocked_at) in stand_in.alerted:
+                            continue
+                        stand_in.alerted.add((code, size, restocked_at))
+                        stand_in.alerts.append((received_at, code, size, restocked_at))
+                self._reply(200, {'ok': True, 'result': {}})
+
+        return Handler
+
+
+# ============================================
+# CAPTURE REPLAY
+# ============================================
+
+REPLAY_EMPTY_PAGE = b'{"products": []}'  # answer for pages the captured scan never requested
+
+
+class CaptureReplay:
+    """Serve a capture's responses in place of the wishlist API.
+
+    Records are grouped into scans by the scan id the monitor wrote;
+    requests outside a scan (page size probes) are skipped. fetch() answers from the scan being replayed for the jar: the last
+    successful body per page, or its last failure when none succeeded
+    (401/403 raise AuthError like the real fetch). A 304 replays the
+    jar's previous body for that page. Pages the scan never requested
+    are past the end of the wishlist and come back empty.
+    """
+
+    def __init__(self, monitor, records):
+        self.monitor = monitor
+        self.lock = threading.Lock()
+        self.scans = {}  # jar -> [(start time, {page: (status, body)})]
+        self.page_sizes = {}  # jar -> most used page size
+        self.current = {}  # jar -> pages of the scan being replayed
+        self.pages_served = 0
+        self.bytes_served = 0
+
+        page_sizes = {}
+        last_bodies = {}  # (jar, page) -> last 200 body, to resolve 304s
+        scan_pages = {}  # (jar, scan id) -> pages of that scan
+        for record in records:
+            if not record.scan:
+                continue
+            if record.status == 304 and (record.jar, record.page) in last_bodies:
+                record = record._replace(status=200, body=last_bodies[record.jar, record.page])
+            elif record.status == 200:
+                last_bodies[record.jar, record.page] = record.body
+            pages = scan_pages.get((record.jar, record.scan))
+            if pages is None:
+                pages = scan_pages[record.jar, record.scan] = {}
+                self.scans.setdefault(record.jar, []).append((record.time, pages))
+            if record.status == 200 or pages.get(record.page, (0,))[0] != 200:
+                pages[record.page] = (record.status, record.body)
+            if record.status == 200:
+                page_sizes.setdefault(record.jar, Counter())[record.page_size] += 1
+        self.page_sizes = {jar: sizes.most_common(1)[0][0] for jar, sizes in page_sizes.items()}
+
+    def timeline(self):
+        """Return [(start time, jar, scan index)] across all jars in capture order"""
+        return sorted(
+            (start, jar, index)
+            for jar, scans in self.scans.items()
+            for index, (start, _) in enumerate(scans)
+        )
+
+    def fetch(self, cookies, page_num, page_size=None, page_cache=None):
+        status, body = self.current[cookies['capture']].get(page_num, (200, REPLAY_EMPTY_PAGE))
+        if status in self.monitor.AUTH_FAILURE_STATUSES:
+            raise self.monitor.AuthError(f"HTTP {status} for page {page_num} (replayed)")
+        if status != 200:
+            return None
+        with self.lock:
+            self.pages_served += 1
+            self.bytes_served += len(body)
+        return body
+
+
+def bench_replay(monitor, server, args):
+    """Replay a capture through scan_account, each jar copied to --multiply accounts"""
+    replay = CaptureReplay(monitor, monitor.read_capture(args.replay))
+    timeline = replay.timeline()
+    if not timeline:
+        raise SystemExit(f"{args.replay} has no complete scans to replay")
+    monitor.fetch_wishlist_page = replay.fetch
+
+    accounts = {}
+    for j, jar in enumerate(replay.scans):
+        accounts[jar] = []
+        for k in range(args.multiply):
+            account = monitor.MonitorAccount(
+                f"replay{j}-{k}", {'capture': jar}, str(200000 + j * args.multiply + k), 'replay'
+            )
+            account.page_cache.page_size = replay.page_sizes.get(jar)
+            accounts[jar].append(account)
+
+    executor = ThreadPoolExecutor(max_workers=args.workers or monitor.ENGINE_WORKERS)
+    durations, behind = [], []
+    first = timeline[0][0]
+    start, process = time.time(), time.process_time()
+    for when, jar, index in timeline:
+        if args.speed > 0:
+            delay = start + (when - first) / args.speed - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            behind.append(max(0.0, -delay))
+        replay.current[jar] = replay.scans[jar][index][1]
+        tick = time.perf_counter()
+        list(executor.map(monitor.scan_account, accounts[jar]))
+        durations.append(time.perf_counter() - tick)
+    elapsed = time.time() - start
+    cpu = time.process_time() - process
+    executor.shutdown()
+
+    monitor.NOTIFIER.flush(timeout=60)
+    scans = sum(len(accounts[jar]) for _, jar, _ in timeline)
+    return {
+        'jars': len(replay.scans),
+        'accounts': sum(len(group) for group in accounts.values()),
+        'capture_seconds': timeline[-1][0] - first,
+        'elapsed_seconds': elapsed,
+        'cpu_seconds': cpu,
+        'scans': scans,
+        'scans_per_second': scans / elapsed if elapsed else 0.0,
+        'pages': replay.pages_served,
+        'megabytes': replay.bytes_served / (1024 * 1024),
+        'tick_seconds': durations,
+        'behind_seconds': behind,
+        'stock_events': {kind: count for (kind,), count in monitor.STOCK_EVENTS.values.items()},
+        'telegram_requests': server.telegram_requests,
+    }
+
+
+def print_replay(args, result):
+    print("")
+    print("=" * 70)
+    print(f"🔁 REPLAY: {args.replay}, {result['jars']} jar(s) x {args.multiply} = {result['accounts']} accounts")
+    print(f"   {result['capture_seconds']:.0f}s of capture at {f'{args.speed:g}x' if args.speed else 'maximum'} speed")
+    print("=" * 70)
+    print(f"scans:            {result['scans']} in {result['elapsed_seconds']:.1f}s "
+          f"({result['scans_per_second']:.1f}/s, cpu {result['cpu_seconds']:.1f}s)")
+    print(f"pages served:     {result['pages']} ({result['megabytes']:.1f} MB)")
+    print(f"scan tick:        {summarize(result['tick_seconds'], 's')}")
+    if result['behind_seconds']:
+        print(f"behind schedule:  {summarize(result['behind_seconds'], 's')}")
+    print(f"stock events:     {', '.join(f'{kind} {count}' for kind, count in sorted(result['stock_events'].items())) or 'none'}")
+    print(f"Telegram sends:   {result['telegram_requests']}")
+    print(f"max RSS:          {max_rss_mb():.1f} MB")
+    print("=" * 70)
+
+
+# ============================================
+# MEASUREMENT
+# ============================================
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def summarize(values, unit=''):
+    if not values:
+        return "n/a"
+    return (
+        f"p50 {percentile(values, 50):.3f}{unit} | "
+        f"p95 {percentile(values, 95):.3f}{unit} | "
+        f"max {max(values):.3f}{unit}"
+    )
+
+
+def max_rss_mb():
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return usage / (1024 * 1024) if sys.platform == 'darwin' else usage / 1024
+
+
+def bench_extract(monitor, server, cookies, rounds):
+    """Time extract_wishlist_products cold (no cache) and warm (PageCache)"""
+    results = {}
+    for label, page_cache in (('cold', None), ('warm', monitor.PageCache())):
+        durations, cpu, requests = [], [], []
+        for _ in range(rounds):
+            before_requests = server.wishlist_requests
+            wall, process = time.perf_counter(), time.process_time()
+            monitor.extract_wishlist_products(cookies, page_cache)
+            durations.append(time.perf_counter() - wall)
+            cpu.append(time.process_time() - process)
+            requests.append(server.wishlist_requests - before_requests)
+        results[label] = {
+            'scan_seconds': durations,
+            'cpu_seconds': cpu,
+            'requests': requests,
+        }
+    return results
+
+
+def bench_monitor_loop(monitor, server, wishlist, cookies, args):
+    """Run the scan loop used by monitor_wishlist with restock bursts"""
+    accounts = [
+        monitor.MonitorAccount(f"bench{i}", dict(cookies), str(100000 + i), 'benchmark')
+        for i in range(args.accounts)
+    ]
+    durations, cpu, requests, wire_bytes, peak_memory = [], [], [], [], []
+
+    if args.trace_memory:
+        import tracemalloc
+        tracemalloc.start()
+
+    next_tick = time.time()
+    for scan in range(args.scans):
+        if scan and args.burst_every and scan % args.burst_every == 0:
+            wishlist.restock(args.burst_size)
+            wishlist.sell_out(args.burst_size // 2)
+
+        before_requests, before_bytes = server.wishlist_requests, server.wishlist_bytes
+        wall, process = time.perf_counter(), time.process_time()
+        if args.trace_memory:
+            tracemalloc.reset_peak()
+
+        for account in accounts:
+            monitor.scan_account(account)
+
+        durations.append(time.perf_counter() - wall)
+        cpu.append(time.process_time() - process)
+        requests.append(server.wishlist_requests - before_requests)
+        wire_bytes.append(server.wishlist_bytes - before_bytes)
+        if args.trace_memory:
+            peak_memory.append(tracemalloc.get_traced_memory()[1] / (1024 * 1024))
+
+        next_tick += args.interval
+        time.sleep(max(0.0, next_tick - time.time()))
+
+    monitor.NOTIFIER.flush(timeout=60)
+    if args.trace_memory:
+        tracemalloc.stop()
+
+    alert_latency = [received_at - restocked_at for received_at, _, _, restocked_at in server.alerts]
+    return {
+        'scan_seconds': durations,
+        'cpu_seconds': cpu,
+        'requests': requests,
+        'bytes': wire_bytes,
+        'peak_memory_mb': peak_memory,
+        'alert_latency_seconds': alert_latency,
+        'alerts': len(server.alerts),
+        'telegram_requests': server.telegram_requests,
+        'restocks': wishlist.restocks,
+    }
+
+
+# ============================================
+# MAIN
+# ============================================
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the SHEIN monitor against local stand-in servers")
+    parser.add_argument('--products', type=int, default=200, help="wishlist size")
+    parser.add_argument('--sizes', type=int, default=3, choices=range(1, len(SIZES) + 1), help="sizes per product")
+    parser.add_argument('--in-stock', type=float, default=0.3, help="initial in-stock ratio per variant")
+    parser.add_argument('--max-page-size', type=int, default=50, help="largest pageSize the fake API honours")
+    parser.add_argument('--latency', type=float, default=0.05, help="wishlist response latency (s)")
+    parser.add_argument('--jitter', type=float, default=0.02, help="+/- latency jitter (s)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of wishlist requests answered 503")
+    parser.add_argument('--compress', action='store_true', help="gzip wishlist responses when the client accepts it")
+    parser.add_argument('--etags', action='store_true', help="send ETags and answer matching If-None-Match with 304")
+    parser.add_argument('--accounts', type=int, default=1, help="accounts scanned per loop tick")
+    parser.add_argument('--scans', type=int, default=20, help="monitor loop scans")
+    parser.add_argument('--interval', type=float, default=0.5, help="seconds between loop scans")
+    parser.add_argument('--burst-every', type=int, default=5, help="inject a restock burst every N scans (0 = never)")
+    parser.add_argument('--burst-size', type=int, default=10, help="variants restocked per burst")
+    parser.add_argument('--extract-rounds', type=int, default=10, help="extract_wishlist_products rounds")
+    parser.add_argument('--trace-memory', action='store_true', help="measure peak allocations per scan (slower)")
+    parser.add_argument('--replay', metavar='CAPTURE', help="replay a CAPTURE_FILE instead of the synthetic benchmark")
+    parser.add_argument('--speed', type=float, default=60.0, help="replay speed-up over capture time (0 = as fast as possible)")
+    parser.add_argument('--multiply', type=int, default=1, help="accounts per captured cookie jar in replay")
+    parser.add_argument('--workers', type=int, default=0, help="threads scanning replay accounts (default: ENGINE_WORKERS)")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', action='store_true', help="print raw results as JSON")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.replay:
+        args.replay = os.path.abspath(args.replay)
+
+    wishlist = None if args.replay else FakeWishlist(args.products, args.sizes, args.in_stock, args.max_page_size, args.seed)
+    server = StandInServer(
+        wishlist, args.latency, args.jitter, args.error_rate, args.seed, args.compress, args.etags
+    ).start()
+
+    # The monitor reads its endpoints at import time and writes its log
+    # and state files to the working directory
+    os.environ['BOT_TOKEN'] = 'benchmark'
+    os.environ['WISHLIST_API'] = f"{server.url}/api/wishlist/getwishlist"
+    os.environ['TELEGRAM_API_BASE'] = server.url
+    os.chdir(tempfile.mkdtemp(prefix='monitor-bench-'))
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    import logging
+    import user_monitor_simple as monitor
+    logging.getLogger().setLevel(logging.WARNING)
+
+    if args.replay:
+        result = bench_replay(monitor, server, args)
+        server.stop()
+        if args.json:
+            print(json.dumps({'replay': result}, indent=2))
+        else:
+            print_replay(args, result)
+        return
+
+    cookies = {'A': 'benchmark', 'B': 'benchmark', 'C': 'benchmark'}
+
+    extract = bench_extract(monitor, server, cookies, args.extract_rounds)
+    loop = bench_monitor_loop(monitor, server, wishlist, cookies, args)
+    server.stop()
+
+    if args.json:
+        print(json.dumps({'extract': extract, 'loop': loop}, indent=2))
+        return
+
+    print("")
+    print("=" * 70)
+    print(f"📊 BENCHMARK: {args.products} products x {args.sizes} sizes, {args.accounts} account(s)")
+    print(f"   latency {args.latency}s ±{args.jitter}s, error rate {args.error_rate:.0%}"
+          f"{', gzip' if args.compress else ''}{', etags' if args.etags else ''}")
+    print("=" * 70)
+    for label, result in extract.items():
+        print(f"extract ({label}):  {summarize(result['scan_seconds'], 's')}")
+        print(f"    cpu/scan:     {summarize(result['cpu_seconds'], 's')}")
+        print(f"    requests:     {statistics.mean(result['requests']):.1f} per scan")
+    print(f"loop scan:        {summarize(loop['scan_seconds'], 's')}")
+    print(f"    cpu/scan:     {summarize(loop['cpu_seconds'], 's')}")
+    print(f"    requests:     {statistics.mean(loop['requests']):.1f} per scan")
+    print(f"    bytes/scan:   {statistics.mean(loop['bytes']) / 1024:.1f} KiB")
+    if loop['peak_memory_mb']:
+        print(f"    peak alloc:   {summarize(loop['peak_memory_mb'], 'MB')}")
+    print(f"restock->alert:   {summarize(loop['alert_latency_seconds'], 's')}")
+    print(f"    alerts:       {loop['alerts']} for {loop['restocks']} restocks "
+          f"({loop['telegram_requests']} Telegram requests)")
+    print(f"bytes served:     {server.wishlist_bytes / 1024:.0f} KiB")
+    print(f"max RSS:          {max_rss_mb():.1f} MB")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
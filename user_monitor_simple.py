@@ -5,12 +5,40 @@ User clones from GitHub, adds cookies.txt, runs script
 """
 
 import requests
+import argparse
+import cProfile
+import gzip
 import json
+import hashlib
+import math
 import time
 import os
+import atexit
+import pstats
+import heapq
 import logging
+import logging.handlers
+import queue
+import random
+import re
+import signal
+import socket
+import sqlite3
+import struct
+import sys
+import threading
+import tracemalloc
+from array import array
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import lru_cache
 from datetime import datetime
+from http.cookiejar import DefaultCookiePolicy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.util.retry import Retry
 
 # Load environment variables
 load_dotenv()
@@ -32,66 +60,1354 @@ if not BOT_TOKEN or BOT_TOKEN == "YOUR_BOT_TOKEN_HERE":
     print("")
     exit(1)
 
+# Admin Chat ID - optional, admin alerts are skipped when unset
+ADMIN_CHAT_ID = os.getenv('ADMIN_CHAT_ID')
+
+# User Chat ID - set it (or pass --chat-id) to start without prompting
+USER_CHAT_ID = os.getenv('USER_CHAT_ID', '').strip() or None
+
 # Cookies file (user creates this)
 COOKIES_FILE = "cookies.txt"
 
+# Accounts file for multi-account mode (--accounts)
+ACCOUNTS_FILE = "accounts.json"
+
 # ============================================
 # MONITORING SETTINGS
 # ============================================
 
 CHECK_INTERVAL = 10  # seconds between checks
-TOTAL_PAGES = 9  # pages to check
-PAGE_SIZE = 10  # products per page
+MIN_CHECK_INTERVAL = 3  # seconds between checks right after a restock
+MAX_CHECK_INTERVAL = 30  # seconds between checks once the wishlist is quiet
+HOT_PERIOD = 300  # seconds of fast polling after a restock
+QUIET_PERIOD = 1800  # seconds without restocks before polling slows down
+POLL_JITTER = 0.1  # random +/- fraction of the interval added to each tick
+MAX_ERROR_BACKOFF = 300  # max seconds between checks while scans keep failing
+TOTAL_PAGES = 9  # pages to check when the API sends no pagination info
+PAGE_SIZE = 10  # products per page (fallback when no larger size is accepted)
+PAGE_SIZE_CANDIDATES = (100, 50, 40, 20)  # larger page sizes probed at startup
 REQUEST_TIMEOUT = 10  # seconds
 MAX_NOTIFICATIONS_PER_PRODUCT = 3  # max alerts per product
+FETCH_CONCURRENCY = 5  # wishlist pages fetched in parallel (1 = sequential)
+ENGINE_WORKERS = 4  # concurrent account scans in multi-account mode
+
+# ============================================
+# HTTP CLIENT SETTINGS
+# ============================================
+
+HTTP_POOL_SIZE = 10  # keep-alive connections per host
+TELEGRAM_POOL_SIZE = 4  # keep-alive connections to api.telegram.org
+HTTP_MAX_RETRIES = 2  # transport-level retries of Telegram requests (wishlist pages retry in the fetch layer)
+HTTP_RETRY_BACKOFF = 0.3  # seconds, doubled on each retry
+FETCH_RETRIES = 2  # extra attempts per wishlist page (timeouts, bad status)
+FETCH_RETRY_BACKOFF = 0.5  # seconds, doubled on each page retry
+PAGE_DEADLINE = 20  # seconds one page may take across all its retries and hedges
+HEDGE_REQUESTS = True  # send a duplicate request when a page is slow
+HEDGE_PERCENTILE = 90  # hedge once a page takes longer than this percentile
+HEDGE_MIN_DELAY = 0.3  # never hedge sooner than this (seconds)
+HEDGE_MIN_SAMPLES = 20  # latency samples needed before hedging starts
+LATENCY_WINDOW = 200  # recent page latencies kept for the percentile
+CONDITIONAL_REQUESTS = True  # revalidate cached pages with ETag/Last-Modified (304 = reuse)
+CAPTURE_FILE = os.getenv('CAPTURE_FILE', '')  # append raw wishlist responses here, e.g. capture.bin.gz ('' = off)
+CAPTURE_FLUSH_INTERVAL = 5  # seconds between flushes of the capture file
+
+# ============================================
+# METRICS SETTINGS
+# ============================================
+
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))  # Prometheus /metrics port (0 = off)
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+
+# ============================================
+# PROFILING SETTINGS
+# ============================================
+
+PROFILE_SCANS = 5  # scans profiled per request (SIGUSR1, trigger file or --profile)
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')  # where the dumps are written
+PROFILE_TRIGGER_FILE = 'profile.request'  # create it (optionally holding a scan count) to start profiling
+PROFILE_SAMPLE_INTERVAL = 0.005  # seconds between stack samples of all threads
+PROFILE_TRACE_FRAMES = 10  # tracemalloc traceback depth
+PROFILE_TOP = 30  # entries in the allocation report
+
+# ============================================
+# HISTORY SETTINGS
+# ============================================
+
+RECORD_HISTORY = False  # keep recent stock/price events per variant
+HISTORY_CAPACITY = 32  # events kept per variant (9 bytes each)
+HISTORY_DIR = 'history'  # one snapshot file per account
+HISTORY_SNAPSHOT_INTERVAL = 300  # seconds between snapshots
+HISTORY_MIN_RESTOCKS = 2  # finished restocks needed before alerts mention their usual length
+PRICE_DROP_ALERTS = True  # alert on price drops of in-stock variants (needs RECORD_HISTORY)
+PRICE_DROP_MIN_PERCENT = 5.0  # smallest drop that triggers an alert
+
+# ============================================
+# NOTIFICATION SETTINGS
+# ============================================
+
+NOTIFY_WORKERS = 4  # background threads delivering Telegram alerts
+TELEGRAM_GLOBAL_RATE = 30  # messages per second across all chats
+TELEGRAM_CHAT_RATE = 1  # messages per second to a single chat
+TELEGRAM_SEND_RETRIES = 4  # retries per alert (errors, 429, 5xx)
+TELEGRAM_RETRY_BACKOFF = 1.0  # seconds, doubled on each retry
+BATCH_ALERTS = True  # one message per recipient per scan instead of one per item
+TELEGRAM_MAX_MESSAGE_LENGTH = 4096  # Telegram's limit (UTF-16 code units)
+
+# ============================================
+# SETTINGS OVERRIDES
+# ============================================
+
+# Settings above that may be overridden from the environment (same name);
+# every one must be defined before the override pass below
+TUNABLE_SETTINGS = (
+    'CHECK_INTERVAL', 'MIN_CHECK_INTERVAL', 'MAX_CHECK_INTERVAL', 'HOT_PERIOD',
+    'QUIET_PERIOD', 'POLL_JITTER', 'MAX_ERROR_BACKOFF', 'TOTAL_PAGES', 'PAGE_SIZE',
+    'REQUEST_TIMEOUT', 'MAX_NOTIFICATIONS_PER_PRODUCT', 'FETCH_CONCURRENCY',
+    'ENGINE_WORKERS', 'FETCH_RETRIES', 'PAGE_DEADLINE', 'HEDGE_REQUESTS', 'BATCH_ALERTS',
+    'RECORD_HISTORY', 'PRICE_DROP_ALERTS', 'PRICE_DROP_MIN_PERCENT', 'CONDITIONAL_REQUESTS',
+)
+
+
+def apply_settings(values):
+    """Set TUNABLE_SETTINGS from {name: value}, converting to each setting's type.
+    
+    Unknown names and unconvertible values are skipped. Returns the
+    names that changed.
+    """
+    module_globals = globals()
+    changed = []
+    for name, raw in values.items():
+        if name not in TUNABLE_SETTINGS or name not in module_globals:
+            continue
+        current = module_globals[name]
+        try:
+            if isinstance(current, bool):
+                value = raw if isinstance(raw, bool) else str(raw).strip().lower() in ('1', 'true', 'yes', 'on')
+            else:
+                value = type(current)(raw)
+        except (TypeError, ValueError):
+            continue
+        if value != current:
+            module_globals[name] = value
+            changed.append(name)
+    return changed
+
+
+apply_settings({name: os.environ[name] for name in TUNABLE_SETTINGS if name in os.environ})
+
+SETTINGS_FILE = os.getenv('SETTINGS_FILE', 'monitor_settings.json')  # {setting: value}, re-read while running
+CONFIG_POLL_INTERVAL = 5  # seconds between checks of the settings and cookie files
 
 # ============================================
 # API ENDPOINTS
 # ============================================
 
-WISHLIST_API = "https://www.sheinindia.in/api/wishlist/getwishlist"
+# Both can be pointed at local stand-ins (see benchmark_monitor.py)
+WISHLIST_API = os.getenv('WISHLIST_API', "https://www.sheinindia.in/api/wishlist/getwishlist")
+TELEGRAM_API = f"{os.getenv('TELEGRAM_API_BASE', 'https://api.telegram.org')}/bot{BOT_TOKEN}"
+
+WISHLIST_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Linux; Android 10) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Mobile Safari/537.36',
+    'Accept': 'application/json',
+    'Accept-Encoding': ACCEPT_ENCODING,  # gzip/deflate, plus br when brotli is installed
+    'Referer': 'https://www.sheinindia.in/',
+}
 
 # ============================================
 # SETUP LOGGING
 # ============================================
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s',
-    handlers=[
-        logging.FileHandler('monitor.log'),
-        logging.StreamHandler()
-    ]
-)
+LOG_FILE = os.getenv('LOG_FILE', 'monitor.log')
+LOG_ASYNC = os.getenv('LOG_ASYNC', '1') != '0'  # format and write on a background thread
+LOG_ROTATE = os.getenv('LOG_ROTATE', 'size')  # "size", "time" or "none"
+LOG_MAX_BYTES = 10 * 1024 * 1024  # size rotation threshold
+LOG_ROTATE_WHEN = 'midnight'  # time rotation interval (see TimedRotatingFileHandler)
+LOG_BACKUP_COUNT = 5  # rotated files kept
+LOG_JSON_FILE = os.getenv('LOG_JSON_FILE', '')  # extra JSON-lines log, e.g. monitor.jsonl ('' = off)
+LOG_FORMAT = '%(asctime)s [%(levelname)s] %(message)s'
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per record for machine ingestion"""
+    
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves all formatting to the listener thread"""
+    
+    def prepare(self, record):
+        return record
+
+
+def create_file_handler(path):
+    """File handler for `path` with the configured rotation"""
+    if LOG_ROTATE == 'size':
+        return logging.handlers.RotatingFileHandler(
+            path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8'
+        )
+    if LOG_ROTATE == 'time':
+        return logging.handlers.TimedRotatingFileHandler(
+            path, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUP_COUNT, encoding='utf-8'
+        )
+    return logging.FileHandler(path, encoding='utf-8')
+
+
+def setup_logging():
+    """Configure the root logger; returns the QueueListener in async mode.
+    
+    In async mode the calling thread only enqueues records; a listener
+    thread formats them and writes the console, the (rotating) log file
+    and the optional JSON-lines file.
+    """
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = [create_file_handler(LOG_FILE), logging.StreamHandler()]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    if LOG_JSON_FILE:
+        json_handler = create_file_handler(LOG_JSON_FILE)
+        json_handler.setFormatter(JsonLinesFormatter())
+        handlers.append(json_handler)
+    
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    
+    if not LOG_ASYNC:
+        for handler in handlers:
+            root.addHandler(handler)
+        return None
+    
+    log_queue = queue.SimpleQueue()
+    root.addHandler(DeferredQueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)  # flush queued records on exit
+    return listener
+
+
+LOG_LISTENER = setup_logging()
 logger = logging.getLogger(__name__)
 
+# ============================================
+# METRICS
+# ============================================
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _escape_label(value):
+    """Escape a label value for the Prometheus text format"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames, labelvalues, extra=()):
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape_label(value)}"' for name, value in pairs) + '}'
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+    
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.values = {}
+        self.lock = threading.Lock()
+    
+    def inc(self, *labelvalues, amount=1):
+        with self.lock:
+            self.values[labelvalues] = self.values.get(labelvalues, 0) + amount
+    
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for labelvalues, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {value}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram with optional labels"""
+    
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self.values = {}  # labelvalues -> [bucket counts..., sum, count]
+        self.lock = threading.Lock()
+    
+    def observe(self, seconds, *labelvalues):
+        with self.lock:
+            series = self.values.get(labelvalues)
+            if series is None:
+                series = self.values[labelvalues] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series[i] += 1
+            series[-2] += seconds
+            series[-1] += 1
+    
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for labelvalues, series in sorted(self.values.items()):
+                for bound, count in zip(self.buckets, series):
+                    labels = _format_labels(self.labelnames, labelvalues, [('le', bound)])
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _format_labels(self.labelnames, labelvalues, [('le', '+Inf')])
+                lines.append(f"{self.name}_bucket{labels} {series[-1]}")
+                labels = _format_labels(self.labelnames, labelvalues)
+                lines.append(f"{self.name}_sum{labels} {series[-2]:.6f}")
+                lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+class Gauge:
+    """Gauge whose per-label values are read from a callback at scrape time"""
+    
+    def __init__(self, name, help_text, labelnames, callback):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.callback = callback
+    
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        for labelvalues, value in sorted(self.callback().items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {value:.3f}")
+        return lines
+
+
+LAST_FULL_SCAN = {}  # account name -> time of the last complete scan
+
+PAGE_FETCH_SECONDS = Histogram('monitor_page_fetch_seconds', 'Wishlist page request latency', ('status',))
+HTTP_RESPONSES = Counter('monitor_http_responses_total', 'Wishlist API responses by HTTP status', ('status',))
+HTTP_ERRORS = Counter('monitor_http_errors_total', 'Wishlist requests that raised', ('error',))
+PAGES_PARSED = Counter('monitor_pages_total', 'Wishlist pages by cache result', ('result',))
+JSON_DECODE_SECONDS = Histogram('monitor_json_decode_seconds', 'JSON decode time per page')
+EXTRACT_SECONDS = Histogram('monitor_variant_extraction_seconds', 'Variant extraction time per page')
+DIFF_SECONDS = Histogram('monitor_diff_seconds', 'Stock diff time per scan')
+SCAN_SECONDS = Histogram('monitor_scan_seconds', 'Full scan time', ('result',))
+STOCK_EVENTS = Counter('monitor_stock_events_total', 'Stock transitions detected', ('kind',))
+TELEGRAM_SEND_SECONDS = Histogram('monitor_telegram_send_seconds', 'Telegram sendMessage latency', ('status',))
+TELEGRAM_ERRORS = Counter('monitor_telegram_errors_total', 'Telegram sends that raised', ('error',))
+NOTIFICATIONS = Counter('monitor_notifications_total', 'Alerts by delivery result', ('result',))
+WISHLIST_BYTES = Counter('monitor_wishlist_bytes_total', 'Wishlist response bytes on the wire', ('encoding',))
+SCAN_BYTES = Histogram('monitor_scan_bytes', 'Wishlist bytes received per account scan', buckets=BYTES_BUCKETS)
+LEASE_EVENTS = Counter('monitor_lease_events_total', 'Account lease changes on this worker (cluster mode)', ('event',))
+LAST_FULL_SCAN_AGE = Gauge(
+    'monitor_last_full_scan_age_seconds', 'Seconds since the last complete scan', ('account',),
+    lambda: {(name, ): time.time() - finished for name, finished in list(LAST_FULL_SCAN.items())}
+)
+
+METRICS = (
+    PAGE_FETCH_SECONDS, HTTP_RESPONSES, HTTP_ERRORS, PAGES_PARSED,
+    JSON_DECODE_SECONDS, EXTRACT_SECONDS, DIFF_SECONDS, SCAN_SECONDS,
+    STOCK_EVENTS, TELEGRAM_SEND_SECONDS, TELEGRAM_ERRORS, NOTIFICATIONS,
+    WISHLIST_BYTES, SCAN_BYTES, LEASE_EVENTS, LAST_FULL_SCAN_AGE,
+)
+
+
+def render_metrics():
+    """Render every metric in Prometheus text format"""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serve GET /metrics"""
+    
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        body = render_metrics().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, *args):
+        pass
+
+
+def start_metrics_server(port=None, host=None):
+    """Serve /metrics in a background thread when METRICS_PORT is set"""
+    port = METRICS_PORT if port is None else port
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((host or METRICS_HOST, port), MetricsHandler)
+    except OSError as e:
+        logger.error(f"❌ Metrics server failed to start on port {port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    logger.info(f"📈 Metrics on http://{server.server_address[0]}:{server.server_address[1]}/metrics")
+    return server
+
+# ============================================
+# PROFILING
+# ============================================
+
+class ScanProfiler:
+    """Profile the next few scans on request, then switch off again.
+    
+    A session covers PROFILE_SCANS scans and writes three files to
+    PROFILE_DIR: a cProfile dump (.pstats), stack samples of every thread
+    in collapsed format for flame graph tools (.folded) and a tracemalloc
+    report of the top allocations and their growth over the session
+    (-memory.txt). Only one profiler may be active per process (enforced
+    since Python 3.12), so cProfile covers one scan at a time and
+    concurrent scans are seen through the samples only. Outside a session
+    the only cost is one stat() of PROFILE_TRIGGER_FILE per scan.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requested = 0
+        self.to_start = 0  # scans left to profile in the running session
+        self.running = 0  # profiled scans in progress
+        self.scans = 0
+        self.profile = None  # the session's cProfile.Profile
+        self.profile_owner = None  # thread whose scan has it enabled
+        self.local = threading.local()
+        self.samples = None
+        self.stop_sampling = None
+        self.sampler = None
+        self.owns_tracemalloc = False
+        self.memory_baseline = None
+    
+    def request(self, scans=None):
+        """Profile the next `scans` scans (safe to call from a signal handler)"""
+        self.requested = max(1, scans or PROFILE_SCANS)
+    
+    def install_signal_handler(self):
+        """Start a session on SIGUSR1 (where available, from the main thread only)"""
+        if hasattr(signal, 'SIGUSR1') and threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self.request())
+    
+    def check_trigger_file(self):
+        if not os.path.exists(PROFILE_TRIGGER_FILE):
+            return
+        try:
+            with open(PROFILE_TRIGGER_FILE, 'r', encoding='utf-8') as f:
+                content = f.read().strip()
+            os.remove(PROFILE_TRIGGER_FILE)
+        except OSError as e:
+            logger.error(f"❌ Error reading {PROFILE_TRIGGER_FILE}: {e}")
+            return
+        self.request(int(content) if content.isdigit() else None)
+    
+    def scan_started(self):
+        """Call before each scan, on the thread that runs it (pair with scan_finished)"""
+        self.local.profiled = self.local.owns_profile = False
+        if not (self.requested or self.to_start or self.running):
+            self.check_trigger_file()
+            if not self.requested:
+                return
+        
+        with self.lock:
+            if self.requested and not (self.to_start or self.running):
+                scans, self.requested = self.requested, 0
+                try:
+                    self._start_session(scans)
+                except Exception as e:
+                    logger.error(f"❌ Could not start profiling: {e}")
+                    self._stop_sampler()
+                    self.to_start = 0
+                    return
+            if not self.to_start:
+                return
+            self.to_start -= 1
+            self.running += 1
+            self.local.profiled = True
+            if self.profile_owner is not None or self.profile is None:
+                return
+            self.profile_owner = threading.get_ident()
+            try:
+                self.profile.enable()
+            except ValueError as e:  # another profiler is active
+                logger.warning(f"⚠️ cProfile unavailable, using stack samples only: {e}")
+                self.profile = self.profile_owner = None
+                return
+            self.local.owns_profile = True
+    
+    def scan_finished(self):
+        """Call after each scan, on the thread that ran it"""
+        if not getattr(self.local, 'profiled', False):
+            return
+        with self.lock:
+            if self.local.owns_profile:
+                self.profile.disable()
+                self.profile_owner = None
+            self.local.profiled = self.local.owns_profile = False
+            self.running -= 1
+            if not (self.to_start or self.running):
+                self._finish_session()
+    
+    def _start_session(self, scans):
+        logger.info(f"🔬 Profiling the next {scans} scans")
+        self.to_start = self.scans = scans
+        self.profile = cProfile.Profile()
+        self.profile_owner = None
+        
+        self.owns_tracemalloc = not tracemalloc.is_tracing()
+        if self.owns_tracemalloc:
+            tracemalloc.start(PROFILE_TRACE_FRAMES)
+        self.memory_baseline = tracemalloc.take_snapshot()
+        
+        self.samples = {}  # (thread name, *code objects) -> sample count
+        self.stop_sampling = threading.Event()
+        self.sampler = threading.Thread(
+            target=self._sample, args=(self.stop_sampling, self.samples),
+            name='profiler', daemon=True
+        )
+        self.sampler.start()
+    
+    def _sample(self, stop, samples):
+        """Count the call stacks of all other threads until stopped"""
+        own_ident = threading.get_ident()
+        while not stop.wait(PROFILE_SAMPLE_INTERVAL):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame.f_code)
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                key = tuple(reversed(stack))  # code objects keep the sampler's own allocations small
+                samples[key] = samples.get(key, 0) + 1
+    
+    def _stop_sampler(self):
+        if self.sampler is not None:
+            self.stop_sampling.set()
+            self.sampler.join()
+            self.sampler = None
+        if self.owns_tracemalloc and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.owns_tracemalloc = False
+    
+    def _finish_session(self):
+        self.stop_sampling.set()
+        self.sampler.join()
+        self.sampler = None
+        
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+        if self.owns_tracemalloc:
+            tracemalloc.stop()
+            self.owns_tracemalloc = False
+        
+        base = os.path.join(PROFILE_DIR, f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')[:-3]}")
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            if self.profile is not None and self.profile.getstats():
+                pstats.Stats(self.profile).dump_stats(base + '.pstats')
+            
+            with open(base + '.folded', 'w', encoding='utf-8') as f:
+                for stack, count in sorted(self.samples.items(), key=lambda item: -item[1]):
+                    frames = ';'.join(
+                        f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                        for code in stack[1:]
+                    )
+                    f.write(f"{stack[0]};{frames} {count}\n")
+            
+            with open(base + '-memory.txt', 'w', encoding='utf-8') as f:
+                f.write(f"Top {PROFILE_TOP} allocations after {self.scans} scans\n\n")
+                for stat in snapshot.statistics('lineno')[:PROFILE_TOP]:
+                    f.write(f"{stat}\n")
+                f.write(f"\nTop {PROFILE_TOP} allocation changes over the session\n\n")
+                for stat in snapshot.compare_to(self.memory_baseline, 'lineno')[:PROFILE_TOP]:
+                    f.write(f"{stat}\n")
+            
+            logger.info(f"🔬 Profile of {self.scans} scans written to {base}.pstats/.folded/-memory.txt")
+        except OSError as e:
+            logger.error(f"❌ Error writing profile to {base}: {e}")
+        finally:
+            self.profile = None
+            self.samples = None
+            self.memory_baseline = None
+
+
+PROFILER = ScanProfiler()
+
+# ============================================
+# HTTP SESSIONS
+# ============================================
+
+def create_session(pool_size, headers=None, retries=HTTP_MAX_RETRIES):
+    """Create a keep-alive session with a pooled adapter, retrying up to `retries` times"""
+    retry = Retry(
+        total=retries,
+        backoff_factor=HTTP_RETRY_BACKOFF,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset(['GET']),
+        raise_on_status=False
+    ) if retries else 0
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=retry
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    if headers:
+        session.headers.update(headers)
+    return session
+
+
+# Long-lived clients, shared by every scan and every alert. Wishlist
+# retries are left to fetch_wishlist_page_reliably, which bounds them
+WISHLIST_SESSION = create_session(max(HTTP_POOL_SIZE, FETCH_CONCURRENCY), WISHLIST_HEADERS, retries=0)
+# Each request carries its account's cookies; never keep Set-Cookie from
+# one account's response for every other account's requests
+WISHLIST_SESSION.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+TELEGRAM_SESSION = create_session(TELEGRAM_POOL_SIZE)
+
+# ============================================
+# RESPONSE CAPTURE
+# ============================================
+
+CAPTURE_MAGIC = b'SHC2'
+CAPTURE_RECORD = struct.Struct('<dQQIHHI')  # time, jar id, scan id, page, page size, status, body length
+
+# scan is 0 for requests outside a scan (page size probes)
+CaptureRecord = namedtuple('CaptureRecord', 'time jar scan page page_size status body')
+
+
+def capture_jar_id(cookies):
+    """Stable 64-bit id of a cookie jar, so captures never contain the cookies"""
+    jar = ';'.join(f"{name}={value}" for name, value in sorted(cookies.items()))
+    return int.from_bytes(hashlib.blake2b(jar.encode(), digest_size=8).digest(), 'little')
+
+
+class CaptureWriter:
+    """Append every wishlist response to a gzip capture file.
+    
+    Each record is a CAPTURE_RECORD header followed by the raw body;
+    status 0 marks a request that raised. Every scan gets an id from
+    next_scan(), so a replay can regroup requests into their scans
+    however they were timed or retried. Records go into a new gzip
+    member every CAPTURE_FLUSH_INTERVAL seconds, so the file only ever
+    grows and a killed process leaves everything before its last member
+    readable. read_capture() reads it back.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        is_new = not os.path.exists(path) or os.path.getsize(path) == 0
+        if not is_new:
+            with gzip.open(path, 'rb') as f:
+                if f.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+                    raise ValueError(f"{path} is not a capture in the current format")
+        self.file = gzip.open(path, 'ab')
+        if is_new:
+            self.file.write(CAPTURE_MAGIC)
+        self.next_flush = time.monotonic() + CAPTURE_FLUSH_INTERVAL
+        self.scan_base = int(time.time()) << 32  # ids stay unique and ordered across restarts
+        self.scans = 0
+    
+    def next_scan(self):
+        """Return a new scan id"""
+        with self.lock:
+            self.scans += 1
+            return self.scan_base | self.scans
+    
+    def write(self, cookies, page_num, page_size, status, body, scan=0):
+        header = CAPTURE_RECORD.pack(
+            time.time(), capture_jar_id(cookies), scan, page_num, page_size, status, len(body)
+        )
+        with self.lock:
+            if self.file is None:
+                return
+            self.file.write(header)
+            self.file.write(body)
+            if time.monotonic() >= self.next_flush:
+                self.file.close()
+                self.file = gzip.open(self.path, 'ab')
+                self.next_flush = time.monotonic() + CAPTURE_FLUSH_INTERVAL
+    
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+def read_capture(path):
+    """Yield the CaptureRecords of a capture file in the order they were written"""
+    with gzip.open(path, 'rb') as f:
+        if f.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+            raise ValueError(f"{path} is not a wishlist capture")
+        try:
+            while True:
+                header = f.read(CAPTURE_RECORD.size)
+                if len(header) < CAPTURE_RECORD.size:
+                    return
+                when, jar, scan, page, page_size, status, length = CAPTURE_RECORD.unpack(header)
+                body = f.read(length)
+                if len(body) < length:
+                    return
+                yield CaptureRecord(when, jar, scan, page, page_size, status, body)
+        except (EOFError, gzip.BadGzipFile) as e:
+            logger.warning(f"⚠️ {path} ends with a truncated record ({e})")
+
+
+CAPTURE = None
+if CAPTURE_FILE:
+    try:
+        CAPTURE = CaptureWriter(CAPTURE_FILE)
+        atexit.register(CAPTURE.close)
+    except (OSError, ValueError, EOFError, gzip.BadGzipFile) as e:
+        logger.error(f"❌ Not capturing responses to {CAPTURE_FILE}: {e}")
+
 # ============================================
 # STATE MANAGEMENT
 # ============================================
 
 NOTIFICATION_COUNT_FILE = "notification_count.json"
-PREVIOUS_STOCK_STATUS = {}
-USER_CHAT_ID = None  # Will be set by user input
+STATE_BACKEND = "sqlite"  # "sqlite" (counts + stock state) or "json" (counts only)
+STATE_DB_FILE = "monitor_state.db"
 
 
-def load_notification_counts():
+def load_notification_counts(path=NOTIFICATION_COUNT_FILE):
     """Load notification counts from file"""
-    if os.path.exists(NOTIFICATION_COUNT_FILE):
+    if os.path.exists(path):
         try:
-            with open(NOTIFICATION_COUNT_FILE, 'r') as f:
+            with open(path, 'r') as f:
                 return json.load(f)
         except:
             return {}
     return {}
 
 
-def save_notification_counts(counts):
+def save_notification_counts(counts, path=NOTIFICATION_COUNT_FILE):
     """Save notification counts to file"""
-    with open(NOTIFICATION_COUNT_FILE, 'w') as f:
-        json.dump(counts, f, indent=2)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(counts, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+class JsonStateStore:
+    """Notification counts in per-account JSON files, stock state in memory.
+    
+    Counts are written once per scan (on commit), not once per alert.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.dirty = {}
+    
+    def load_counts(self, account):
+        return load_notification_counts(account.counts_file)
+    
+    def load_stock_state(self, account):
+        return None
+    
+    def set_count(self, account, product_code, count):
+        with self.lock:
+            self.dirty[account.counts_file] = account.notification_counts
+    
+    def set_stock(self, account, product_code, size, in_stock, price=None):
+        pass
+    
+    def commit(self):
+        with self.lock:
+            dirty, self.dirty = self.dirty, {}
+            for path, counts in dirty.items():
+                save_notification_counts(dict(counts), path)
+    
+    def close(self):
+        self.commit()
+
+
+class SqliteStateStore:
+    """Notification counts and per-variant stock state in SQLite (WAL).
+    
+    Writes are buffered in memory and flushed in one transaction per
+    commit(), so a scan costs at most one fsync. A restarted process
+    reloads both tables and resumes without a fresh baseline scan.
+    Legacy notification_count.json files are imported on first load.
+    """
+    
+    def __init__(self, path=STATE_DB_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.pending_counts = {}
+        self.pending_stock = {}
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS notification_counts (
+                account TEXT NOT NULL,
+                product_code TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (account, product_code)
+            );
+            CREATE TABLE IF NOT EXISTS stock_state (
+                account TEXT NOT NULL,
+                product_code TEXT NOT NULL,
+                size TEXT NOT NULL,
+                in_stock INTEGER NOT NULL,
+                price REAL,
+                PRIMARY KEY (account, product_code, size)
+            );
+        """)
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(stock_state)")]
+        if 'price' not in columns:
+            self.conn.execute("ALTER TABLE stock_state ADD COLUMN price REAL")
+        self.conn.commit()
+    
+    def load_counts(self, account):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT product_code, count FROM notification_counts WHERE account = ?",
+                (account.name,)
+            ).fetchall()
+        if rows:
+            return dict(rows)
+        
+        counts = load_notification_counts(account.counts_file)
+        if counts:
+            logger.info(f"📥 Importing {len(counts)} notification counts from {account.counts_file}")
+            for product_code, count in counts.items():
+                self.set_count(account, product_code, count)
+            self.commit()
+        return counts
+    
+    def load_stock_state(self, account):
+        """Return {(product_code, size): (in_stock, price)}, or None if never saved"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT product_code, size, in_stock, price FROM stock_state WHERE account = ? AND size != ''",
+                (account.name,)
+            ).fetchall()
+        if not rows:
+            return None
+        return {(code, size): (bool(in_stock), price) for code, size, in_stock, price in rows}
+    
+    def set_count(self, account, product_code, count):
+        with self.lock:
+            self.pending_counts[(account.name, product_code)] = count
+    
+    def set_stock(self, account, product_code, size, in_stock, price=None):
+        with self.lock:
+            self.pending_stock[(account.name, product_code, size)] = (int(in_stock), price)
+    
+    def commit(self):
+        with self.lock:
+            if not self.pending_counts and not self.pending_stock:
+                return
+            counts, self.pending_counts = self.pending_counts, {}
+            stock, self.pending_stock = self.pending_stock, {}
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO notification_counts VALUES (?, ?, ?)",
+                    [key + (count,) for key, count in counts.items()]
+                )
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO stock_state VALUES (?, ?, ?, ?, ?)",
+                    [key + value for key, value in stock.items()]
+                )
+    
+    def close(self):
+        self.commit()
+        with self.lock:
+            self.conn.close()
+
+
+_STATE_STORE = None
+
+
+def get_state_store():
+    """Return the shared state store selected by STATE_BACKEND"""
+    global _STATE_STORE
+    if _STATE_STORE is None:
+        if STATE_BACKEND == "sqlite":
+            _STATE_STORE = SqliteStateStore(STATE_DB_FILE)
+        else:
+            _STATE_STORE = JsonStateStore()
+    return _STATE_STORE
+
+
+# ============================================
+# STOCK DIFF ENGINE
+# ============================================
 
+# One in-stock (productCode, size) seen in a scan
+WishlistVariant = namedtuple('WishlistVariant', 'productCode size name price url')
 
-NOTIFICATION_COUNTS = load_notification_counts()
+EVENT_IN_STOCK = 'in_stock'
+EVENT_OUT_OF_STOCK = 'out_of_stock'
+EVENT_PRICE_CHANGED = 'price_changed'
+
+# A stock transition; `variant` is None for out-of-stock events
+StockEvent = namedtuple('StockEvent', 'kind productCode size variant old_price')
+
+
+class VariantStockTable:
+    """Stock state per (productCode, size), stored in flat arrays.
+    
+    Each variant gets a slot number once; prices live in an array('d')
+    and the in-stock set holds slot numbers, so a scan allocates nothing
+    for variants that did not change. Out-of-stock variants are found by
+    one set difference instead of walking every known key.
+    """
+    
+    __slots__ = ('slots', 'keys', 'prices', 'in_stock')
+    
+    def __init__(self):
+        self.slots = {}  # (productCode, size) -> slot
+        self.keys = []  # slot -> (productCode, size)
+        self.prices = array('d')
+        self.in_stock = set()  # slots currently in stock
+    
+    def __len__(self):
+        return len(self.keys)
+    
+    def _slot(self, key, price=math.nan):
+        slot = self.slots.get(key)
+        if slot is None:
+            slot = self.slots[key] = len(self.keys)
+            self.keys.append(key)
+            self.prices.append(price)
+        return slot
+    
+    def load(self, saved_state):
+        """Restore from {(productCode, size): (in_stock, price)}"""
+        for key, (in_stock, price) in saved_state.items():
+            slot = self._slot(key, math.nan if price is None else price)
+            if in_stock:
+                self.in_stock.add(slot)
+    
+    def diff(self, variants, emit=True, complete=True):
+        """Apply one full scan of in-stock variants and return the events.
+        
+        With emit=False the scan is recorded as a baseline and no events
+        are returned. An incomplete scan never marks anything out of
+        stock, since unseen variants may be on pages that failed.
+        """
+        events = []
+        seen = set()
+        prices = self.prices
+        in_stock = self.in_stock
+        
+        for variant in variants:
+            price = float(variant.price or 0)
+            slot = self._slot((variant.productCode, variant.size), price)
+            if slot in seen:
+                continue
+            seen.add(slot)
+            
+            old_price = prices[slot]
+            if slot not in in_stock:
+                if emit:
+                    events.append(StockEvent(EVENT_IN_STOCK, variant.productCode, variant.size, variant, None))
+            elif old_price != price and emit and not math.isnan(old_price):
+                events.append(StockEvent(EVENT_PRICE_CHANGED, variant.productCode, variant.size, variant, old_price))
+            prices[slot] = price
+        
+        if not complete:
+            in_stock |= seen
+            return events
+        
+        gone = in_stock - seen
+        if emit:
+            keys = self.keys
+            for slot in gone:
+                code, size = keys[slot]
+                events.append(StockEvent(EVENT_OUT_OF_STOCK, code, size, None, None))
+        
+        self.in_stock = seen
+        return events
+    
+    def diff_pages(self, changes, complete=True):
+        """Apply only the pages that changed since the last scan.
+        
+        `changes` is a list of (old_variants, new_variants) per changed
+        page (see PageCache); work is proportional to those pages, and a
+        variant that merely moved between pages produces no event.
+        Incomplete scans skip removals, as in diff().
+        """
+        events = []
+        removed = {}
+        added = {}
+        for old_variants, new_variants in changes:
+            for variant in old_variants:
+                removed[(variant.productCode, variant.size)] = variant
+            for variant in new_variants:
+                added.setdefault((variant.productCode, variant.size), variant)
+        
+        prices = self.prices
+        in_stock = self.in_stock
+        
+        for key, variant in added.items():
+            price = float(variant.price or 0)
+            slot = self._slot(key, price)
+            old_price = prices[slot]
+            if slot not in in_stock:
+                in_stock.add(slot)
+                events.append(StockEvent(EVENT_IN_STOCK, key[0], key[1], variant, None))
+            elif old_price != price and not math.isnan(old_price):
+                events.append(StockEvent(EVENT_PRICE_CHANGED, key[0], key[1], variant, old_price))
+            prices[slot] = price
+        
+        if not complete:
+            return events
+        
+        for key in removed:
+            if key in added:
+                continue
+            slot = self.slots.get(key)
+            if slot in in_stock:
+                in_stock.discard(slot)
+                events.append(StockEvent(EVENT_OUT_OF_STOCK, key[0], key[1], None, None))
+        
+        return events
+    
+    def price(self, key):
+        """Last seen price of a variant, or None"""
+        slot = self.slots.get(key)
+        if slot is None or math.isnan(self.prices[slot]):
+            return None
+        return self.prices[slot]
+    
+    def state(self):
+        """Return {(productCode, size): (in_stock, price)} for every known variant"""
+        in_stock = self.in_stock
+        prices = self.prices
+        return {
+            key: (slot in in_stock, None if math.isnan(prices[slot]) else prices[slot])
+            for slot, key in enumerate(self.keys)
+        }
+
+
+# ============================================
+# STOCK HISTORY
+# ============================================
+
+# Event kinds as stored in the history arrays
+HISTORY_KINDS = (EVENT_OUT_OF_STOCK, EVENT_IN_STOCK, EVENT_PRICE_CHANGED)
+HISTORY_KIND_CODES = {kind: code for code, kind in enumerate(HISTORY_KINDS)}
+
+HISTORY_MAGIC = b'SHH1'
+HISTORY_HEADER = struct.Struct('<4sHII')  # magic, capacity, variants, key blob length
+
+
+class StockHistory:
+    """The last `capacity` stock/price events per (productCode, size).
+    
+    Events live in fixed-size rings inside flat arrays: variant slot s
+    owns entries [s * capacity, (s + 1) * capacity) of `times` (epoch
+    seconds), `kinds` and `prices` (float32, NaN = unknown). Each tracked
+    variant costs 9 bytes per entry however long the monitor runs.
+    save()/load() write the arrays as one little-endian binary snapshot.
+    """
+    
+    __slots__ = ('capacity', 'slots', 'keys', 'by_code', 'times', 'kinds', 'prices', 'heads', 'counts', 'next_snapshot')
+    
+    def __init__(self, capacity=None):
+        self.capacity = capacity or HISTORY_CAPACITY
+        self.slots = {}  # (productCode, size) -> slot
+        self.keys = []  # slot -> (productCode, size)
+        self.by_code = {}  # productCode -> slots
+        self.times = array('I')
+        self.kinds = array('b')
+        self.prices = array('f')
+        self.heads = array('H')  # slot -> next ring position
+        self.counts = array('H')  # slot -> entries in use
+        self.next_snapshot = time.monotonic() + HISTORY_SNAPSHOT_INTERVAL
+    
+    def __len__(self):
+        return len(self.keys)
+    
+    def _slot(self, key):
+        slot = self.slots.get(key)
+        if slot is None:
+            slot = self.slots[key] = len(self.keys)
+            self.keys.append(key)
+            self.by_code.setdefault(key[0], []).append(slot)
+            self.times.extend([0] * self.capacity)
+            self.kinds.extend([0] * self.capacity)
+            self.prices.extend([math.nan] * self.capacity)
+            self.heads.append(0)
+            self.counts.append(0)
+        return slot
+    
+    def record(self, key, kind, when, price=None):
+        """Append one event, overwriting the variant's oldest when full"""
+        slot = self._slot(key)
+        head = self.heads[slot]
+        index = slot * self.capacity + head
+        self.times[index] = int(when)
+        self.kinds[index] = HISTORY_KIND_CODES[kind]
+        self.prices[index] = math.nan if price is None else price
+        self.heads[slot] = (head + 1) % self.capacity
+        if self.counts[slot] < self.capacity:
+            self.counts[slot] += 1
+    
+    def _indexes(self, slot):
+        """Array indexes of a slot's entries, oldest first"""
+        count = self.counts[slot]
+        start = self.heads[slot] - count
+        base = slot * self.capacity
+        return [base + (start + n) % self.capacity for n in range(count)]
+    
+    def events(self, key):
+        """Return [(time, kind, price)] oldest first (price None if unknown)"""
+        slot = self.slots.get(key)
+        if slot is None:
+            return []
+        return [
+            (self.times[i], HISTORY_KINDS[self.kinds[i]], None if math.isnan(self.prices[i]) else self.prices[i])
+            for i in self._indexes(slot)
+        ]
+    
+    def lowest_price(self, key):
+        prices = [price for _, _, price in self.events(key) if price is not None]
+        return min(prices) if prices else None
+    
+    def restock_durations(self, product_code):
+        """Seconds each recorded in-stock period of any size lasted"""
+        in_stock_code = HISTORY_KIND_CODES[EVENT_IN_STOCK]
+        out_of_stock_code = HISTORY_KIND_CODES[EVENT_OUT_OF_STOCK]
+        durations = []
+        for slot in self.by_code.get(product_code, ()):
+            started = None
+            for i in self._indexes(slot):
+                if self.kinds[i] == in_stock_code:
+                    started = self.times[i]
+                elif self.kinds[i] == out_of_stock_code and started is not None:
+                    durations.append(self.times[i] - started)
+                    started = None
+        return durations
+    
+    def typical_restock_duration(self, product_code):
+        """Median restock length in seconds, or None with fewer than HISTORY_MIN_RESTOCKS"""
+        durations = sorted(self.restock_durations(product_code))
+        if len(durations) < max(1, HISTORY_MIN_RESTOCKS):
+            return None
+        return durations[len(durations) // 2]
+    
+    def save(self, path):
+        """Write a snapshot atomically"""
+        key_blob = '\0'.join(f"{code}\0{size}" for code, size in self.keys).encode('utf-8')
+        arrays = [self.heads, self.counts, self.times, self.kinds, self.prices]
+        if sys.byteorder == 'big':
+            arrays = [array(a.typecode, a) for a in arrays]
+            for a in arrays:
+                a.byteswap()
+        
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(HISTORY_HEADER.pack(HISTORY_MAGIC, self.capacity, len(self.keys), len(key_blob)))
+            f.write(key_blob)
+            for a in arrays:
+                a.tofile(f)
+        os.replace(tmp_path, path)
+    
+    def load(self, path):
+        """Restore a snapshot; returns False when there is none or it is unreadable"""
+        try:
+            with open(path, 'rb') as f:
+                magic, capacity, variants, key_length = HISTORY_HEADER.unpack(f.read(HISTORY_HEADER.size))
+                if magic != HISTORY_MAGIC:
+                    raise ValueError("not a history snapshot")
+                key_blob = f.read(key_length).decode('utf-8')
+                arrays = []
+                for typecode, length in (('H', variants), ('H', variants), ('I', variants * capacity),
+                                         ('b', variants * capacity), ('f', variants * capacity)):
+                    a = array(typecode)
+                    a.fromfile(f, length)
+                    if sys.byteorder == 'big':
+                        a.byteswap()
+                    arrays.append(a)
+        except FileNotFoundError:
+            return False
+        except (OSError, EOFError, ValueError, struct.error) as e:
+            logger.error(f"❌ Error loading history from {path}: {e}")
+            return False
+        
+        parts = key_blob.split('\0') if variants else []
+        keys = list(zip(parts[0::2], parts[1::2]))
+        heads, counts, times, kinds, prices = arrays
+        if capacity == self.capacity:
+            for slot, key in enumerate(keys):
+                self.slots[key] = slot
+                self.keys.append(key)
+                self.by_code.setdefault(key[0], []).append(slot)
+            self.heads, self.counts, self.times, self.kinds, self.prices = arrays
+            return True
+        
+        # HISTORY_CAPACITY changed: replay the newest events into the new rings
+        for slot, key in enumerate(keys):
+            count = counts[slot]
+            base = slot * capacity
+            for n in range(count):
+                i = base + (heads[slot] - count + n) % capacity
+                self.record(key, HISTORY_KINDS[kinds[i]], times[i], None if math.isnan(prices[i]) else prices[i])
+        return True
+
+
+def account_history(account):
+    """Return the account's StockHistory, creating it from its snapshot on first use"""
+    if account.history is None:
+        account.history = StockHistory()
+        path = history_path(account)
+        if account.history.load(path):
+            logger.info(f"📚 [{account.name}] Loaded history for {len(account.history)} variants from {path}")
+        atexit.register(save_account_history, account)
+    return account.history
+
+
+def history_path(account):
+    return os.path.join(HISTORY_DIR, f"{account.name}.bin")
+
+
+def save_account_history(account):
+    """Snapshot the account's history to HISTORY_DIR"""
+    history = account.history
+    if history is None:
+        return
+    history.next_snapshot = time.monotonic() + HISTORY_SNAPSHOT_INTERVAL
+    try:
+        os.makedirs(HISTORY_DIR, exist_ok=True)
+        history.save(history_path(account))
+    except OSError as e:
+        logger.error(f"❌ Error saving history for {account.name}: {e}")
+
+
+def format_duration(seconds):
+    if seconds < 60:
+        return "under a minute"
+    if seconds < 7200:
+        return f"{round(seconds / 60)} min"
+    return f"{seconds / 3600:.1f} hours"
+
+# ============================================
+# POLL SCHEDULER
+# ============================================
+
+class PollScheduler:
+    """Decide when an account is scanned next.
+    
+    Ticks are fixed-rate (anchored to the previous tick, not to the end
+    of the scan) with POLL_JITTER applied per tick. The interval is
+    MIN_CHECK_INTERVAL for HOT_PERIOD after a restock, MAX_CHECK_INTERVAL
+    after QUIET_PERIOD without one and CHECK_INTERVAL otherwise. Failed
+    or throttled scans back off exponentially up to MAX_ERROR_BACKOFF.
+    """
+    
+    __slots__ = ('anchor', 'last_activity', 'failures')
+    
+    def __init__(self, now=None):
+        now = time.time() if now is None else now
+        self.anchor = now
+        self.last_activity = now - HOT_PERIOD  # start at the normal rate
+        self.failures = 0
+    
+    def record(self, restocks=0, ok=True, now=None):
+        """Feed back the outcome of a scan"""
+        now = time.time() if now is None else now
+        if restocks:
+            self.last_activity = now
+        self.failures = 0 if ok else self.failures + 1
+    
+    def interval(self, now=None):
+        now = time.time() if now is None else now
+        if self.failures:
+            return min(MAX_ERROR_BACKOFF, CHECK_INTERVAL * 2 ** self.failures)
+        quiet_for = now - self.last_activity
+        if quiet_for < HOT_PERIOD:
+            return MIN_CHECK_INTERVAL
+        if quiet_for > QUIET_PERIOD:
+            return MAX_CHECK_INTERVAL
+        return CHECK_INTERVAL
+    
+    def next_tick(self, now=None):
+        """Advance to the next tick and return its (jittered) time"""
+        now = time.time() if now is None else now
+        interval = self.interval(now)
+        if self.failures:
+            self.anchor = now + interval
+        else:
+            self.anchor += interval
+            if self.anchor < now:
+                self.anchor = now  # scan overran; skip the missed ticks
+        return self.anchor + random.uniform(-POLL_JITTER, POLL_JITTER) * interval
+
+
+def file_mtime(path):
+    """Return the file's mtime in nanoseconds, or None if it can't be read"""
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class MonitorAccount:
+    """State for one monitored wishlist (cookie jar + Telegram chat)"""
+    
+    __slots__ = (
+        'name', 'cookies', 'cookies_file', 'cookies_mtime', 'chat_id',
+        'username', 'counts_file', 'store', 'stock_table', 'page_cache',
+        'scheduler', 'has_baseline', 'notification_counts', 'scan_count', 'history'
+    )
+    
+    def __init__(self, name, cookies, chat_id, username='Unknown', counts_file=NOTIFICATION_COUNT_FILE, store=None,
+                 cookies_file=COOKIES_FILE):
+        self.name = name
+        self.cookies = cookies
+        self.cookies_file = cookies_file
+        self.cookies_mtime = file_mtime(cookies_file)
+        self.chat_id = chat_id
+        self.username = username
+        self.counts_file = counts_file
+        self.store = store or get_state_store()
+        self.scan_count = 0
+        self.scheduler = PollScheduler()
+        self.history = None  # StockHistory, created on first use when RECORD_HISTORY is on
+        self.load_state()
+    
+    def load_state(self):
+        """(Re)load notification counts and stock state from the store"""
+        self.notification_counts = self.store.load_counts(self)
+        
+        # No alerts until the baseline scan ran (or state was restored)
+        self.stock_table = VariantStockTable()
+        self.page_cache = PageCache()
+        saved_state = self.store.load_stock_state(self)
+        self.has_baseline = saved_state is not None
+        if saved_state is not None:
+            self.stock_table.load(saved_state)
 
 
 def parse_cookie_header(cookie_string):
@@ -105,10 +1421,10 @@ def parse_cookie_header(cookie_string):
     return cookies
 
 
-def load_cookies():
+def load_cookies(path=COOKIES_FILE):
     """Load cookies from cookies.txt file"""
-    if not os.path.exists(COOKIES_FILE):
-        logger.error(f"❌ Cookies file not found: {COOKIES_FILE}")
+    if not os.path.exists(path):
+        logger.error(f"❌ Cookies file not found: {path}")
         logger.error("")
         logger.error("Please create cookies.txt file with your SHEIN cookies!")
         logger.error("")
@@ -125,7 +1441,7 @@ def load_cookies():
         return None
     
     try:
-        with open(COOKIES_FILE, 'r', encoding='utf-8') as f:
+        with open(path, 'r', encoding='utf-8') as f:
             cookie_string = f.read().strip()
             
         if not cookie_string:
@@ -138,7 +1454,7 @@ def load_cookies():
             logger.error("❌ Invalid cookies! Too few cookies found.")
             return None
             
-        logger.info(f"✅ Loaded {len(cookies)} cookies from {COOKIES_FILE}")
+        logger.info(f"✅ Loaded {len(cookies)} cookies from {path}")
         return cookies
         
     except Exception as e:
@@ -146,6 +1462,98 @@ def load_cookies():
         return None
 
 
+_COOKIE_RELOAD_LOCK = threading.Lock()
+
+
+def reload_account_cookies(account, force=False):
+    """Swap in the account's cookie file if it changed since it was loaded.
+    
+    The jar is replaced as a whole, so a scan in progress keeps using the
+    old one. An unreadable or invalid file leaves the current cookies in
+    place. Returns True when account.cookies was replaced.
+    """
+    with _COOKIE_RELOAD_LOCK:
+        mtime = file_mtime(account.cookies_file)
+        if mtime is None or (mtime == account.cookies_mtime and not force):
+            return False
+        account.cookies_mtime = mtime
+        cookies = load_cookies(account.cookies_file)
+        if not cookies or cookies == account.cookies:
+            return False
+        account.cookies = cookies
+    logger.info(f"🍪 [{account.name}] Switched to the updated cookies from {account.cookies_file}")
+    return True
+
+
+class ConfigWatcher:
+    """Hot-reload SETTINGS_FILE and the accounts' cookie files between scans.
+    
+    poll() checks the files' mtimes at most every CONFIG_POLL_INTERVAL
+    seconds; SIGHUP makes the next poll re-read everything regardless.
+    Settings go through apply_settings, so the file uses the
+    TUNABLE_SETTINGS names, e.g. {"CHECK_INTERVAL": 15}.
+    """
+    
+    def __init__(self, accounts, settings_file=SETTINGS_FILE):
+        self.accounts = accounts
+        self.settings_file = settings_file
+        self.settings_mtime = None
+        self.next_check = 0
+        self.reload_requested = False
+    
+    def install_signal_handler(self):
+        """Reload on SIGHUP (where available, from the main thread only)"""
+        if hasattr(signal, 'SIGHUP') and threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGHUP, lambda signum, frame: self.request_reload())
+    
+    def request_reload(self):
+        self.reload_requested = True
+    
+    def poll(self):
+        """Apply changed settings and cookies; returns the changed setting names"""
+        now = time.monotonic()
+        force = self.reload_requested
+        if not force and now < self.next_check:
+            return []
+        self.reload_requested = False
+        self.next_check = now + CONFIG_POLL_INTERVAL
+        
+        changed = self.reload_settings(force)
+        for account in self.accounts:
+            reload_account_cookies(account, force)
+        return changed
+    
+    def reload_settings(self, force=False):
+        mtime = file_mtime(self.settings_file)
+        if mtime is None or (mtime == self.settings_mtime and not force):
+            return []
+        self.settings_mtime = mtime
+        
+        try:
+            with open(self.settings_file, 'r', encoding='utf-8') as f:
+                values = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"❌ Error loading settings from {self.settings_file}: {e}")
+            return []
+        if not isinstance(values, dict):
+            logger.error(f"❌ {self.settings_file} must contain a JSON object")
+            return []
+        
+        changed = apply_settings(values)
+        if not changed:
+            return []
+        module_globals = globals()
+        logger.info("⚙️  Settings reloaded: " + ", ".join(f"{name}={module_globals[name]}" for name in changed))
+        
+        if 'FETCH_CONCURRENCY' in changed:
+            reset_fetch_executors()
+        if 'PAGE_SIZE' in changed or 'TOTAL_PAGES' in changed:
+            # Cached pages were cut at the old size; start over with a full diff
+            for account in self.accounts:
+                account.page_cache = PageCache()
+        return changed
+
+
 def get_user_chat_id():
     """Get user's Chat ID from input"""
     print("")
@@ -187,178 +1595,1031 @@ def get_user_chat_id():
             print("")
 
 
+def post_telegram_message(chat_id, message):
+    """POST sendMessage and return the raw response"""
+    data = {
+        "chat_id": chat_id,
+        "text": message,
+        "parse_mode": "Markdown"
+    }
+    start_time = time.perf_counter()
+    try:
+        response = TELEGRAM_SESSION.post(f"{TELEGRAM_API}/sendMessage", json=data, timeout=10)
+    except Exception as e:
+        TELEGRAM_SEND_SECONDS.observe(time.perf_counter() - start_time, 'error')
+        TELEGRAM_ERRORS.inc(type(e).__name__)
+        raise
+    TELEGRAM_SEND_SECONDS.observe(time.perf_counter() - start_time, str(response.status_code))
+    return response
+
+
 def send_telegram_message(chat_id, message):
     """Send message via Telegram Bot API"""
+    if not chat_id:
+        return False
     try:
-        url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
-        data = {
-            "chat_id": chat_id,
-            "text": message,
-            "parse_mode": "Markdown"
-        }
-        response = requests.post(url, json=data, timeout=10)
+        response = post_telegram_message(chat_id, message)
         return response.status_code == 200
     except Exception as e:
         logger.error(f"❌ Failed to send Telegram message: {e}")
         return False
 
 
-def send_notification_to_user(product):
-    """Send notification to user"""
-    raw_url = product.get('url', '')
+class TokenBucket:
+    """Thread-safe token bucket handing out send slots"""
+    
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated', 'lock')
+    
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def reserve(self):
+        """Take one token and return how long to wait before using it"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+    
+    def defer(self, seconds):
+        """Block the bucket for `seconds` (Telegram retry_after)"""
+        with self.lock:
+            self.tokens = min(self.tokens, 0.0) - seconds * self.rate
+    
+    def wait_time(self):
+        """Seconds until a token is available, without taking it"""
+        with self.lock:
+            tokens = min(self.capacity, self.tokens + (time.monotonic() - self.updated) * self.rate)
+            return 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+
+
+class NotificationDispatcher:
+    """Deliver Telegram messages from background workers.
+    
+    Scans only enqueue; NOTIFY_WORKERS threads do the sending, limited by
+    a global and a per-chat token bucket. Each chat has its own FIFO and
+    chats wait in a heap keyed by the time their bucket allows the next
+    send, so a rate-limited chat (e.g. the shared admin chat) never holds
+    a worker while other chats have messages due. 429 responses block the
+    chat's bucket for retry_after seconds, other failures retry that chat
+    with exponential backoff. 4xx errors other than 429 are not retried.
+    """
+    
+    def __init__(self, workers=None):
+        self.workers = max(1, workers or NOTIFY_WORKERS)
+        self.global_bucket = TokenBucket(TELEGRAM_GLOBAL_RATE)
+        self.chat_buckets = {}
+        self.chats = {}  # chat_id -> deque of [message, label, attempt, error]
+        self.ready = []  # heap of (ready_at, seq, chat_id) for chats not being sent to
+        self.seq = 0
+        self.unfinished = 0
+        self.cond = threading.Condition()
+        self.lock = threading.Lock()
+        self.threads = []
+    
+    def start(self):
+        with self.lock:
+            if self.threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f'notify-{i}', daemon=True)
+                thread.start()
+                self.threads.append(thread)
+    
+    def submit(self, chat_id, message, label='chat'):
+        """Queue a message for delivery; returns False if there is no chat"""
+        if not chat_id:
+            return False
+        self.start()
+        with self.cond:
+            pending = self.chats.get(chat_id)
+            if pending is None:
+                pending = self.chats[chat_id] = deque()
+                self._schedule(chat_id, time.monotonic() + self._chat_bucket(chat_id).wait_time())
+            pending.append([message, label, 0, None])
+            self.unfinished += 1
+        return True
+    
+    def flush(self, timeout=None):
+        """Wait until every message is delivered or given up (or timeout); returns True if drained"""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self.cond:
+            while self.unfinished:
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.cond.wait(remaining)
+        return True
+    
+    def _chat_bucket(self, chat_id):
+        with self.lock:
+            bucket = self.chat_buckets.get(chat_id)
+            if bucket is None:
+                bucket = self.chat_buckets[chat_id] = TokenBucket(TELEGRAM_CHAT_RATE)
+            return bucket
+    
+    def _schedule(self, chat_id, ready_at):
+        """Put an idle chat back in the heap (caller holds self.cond)"""
+        self.seq += 1
+        heapq.heappush(self.ready, (ready_at, self.seq, chat_id))
+        self.cond.notify_all()
+    
+    def _next_chat(self):
+        """Block until a chat is due, then take it out of the heap"""
+        with self.cond:
+            while True:
+                now = time.monotonic()
+                if self.ready and self.ready[0][0] <= now:
+                    chat_id = heapq.heappop(self.ready)[2]
+                    return chat_id, self.chats[chat_id][0]
+                self.cond.wait(self.ready[0][0] - now if self.ready else None)
+    
+    def _worker(self):
+        while True:
+            chat_id, item = self._next_chat()
+            retry_at = None
+            try:
+                retry_at = self._deliver(chat_id, item)
+            except Exception as e:
+                logger.error(f"❌ Notification worker error: {e}")
+            
+            with self.cond:
+                pending = self.chats[chat_id]
+                if retry_at is None:
+                    pending.popleft()
+                    self.unfinished -= 1
+                    if not pending:
+                        del self.chats[chat_id]
+                        self.cond.notify_all()
+                        continue
+                    retry_at = time.monotonic() + self._chat_bucket(chat_id).wait_time()
+                self._schedule(chat_id, retry_at)
+    
+    def _deliver(self, chat_id, item):
+        """Make one send attempt; returns when to retry, or None when done with the message"""
+        message, label, attempt, error = item
+        chat_bucket = self._chat_bucket(chat_id)
+        delay = chat_bucket.wait_time()
+        if delay > 0:
+            return time.monotonic() + delay
+        chat_bucket.reserve()
+        delay = self.global_bucket.reserve()
+        if delay > 0:
+            time.sleep(delay)
+        
+        retry_at = None
+        try:
+            response = post_telegram_message(chat_id, message)
+        except Exception as e:
+            error = str(e)
+        else:
+            if response.status_code == 200:
+                NOTIFICATIONS.inc('sent')
+                logger.info(f"📨 Alert sent to {label}")
+                return None
+            
+            error = f"HTTP {response.status_code}"
+            if response.status_code == 429:
+                try:
+                    retry_after = response.json().get('parameters', {}).get('retry_after', 1)
+                except ValueError:
+                    retry_after = 1
+                chat_bucket.defer(retry_after)
+                retry_at = time.monotonic() + chat_bucket.wait_time()
+            elif response.status_code < 500:
+                attempt = TELEGRAM_SEND_RETRIES  # not retryable
+        
+        if attempt < TELEGRAM_SEND_RETRIES:
+            if retry_at is None:
+                retry_at = time.monotonic() + TELEGRAM_RETRY_BACKOFF * (2 ** attempt)
+            item[2:] = [attempt + 1, error]
+            return retry_at
+        
+        NOTIFICATIONS.inc('failed')
+        logger.error(f"❌ Failed to send alert to {label}: {error}")
+        return None
+
+
+NOTIFIER = NotificationDispatcher()
+
+
+def get_telegram_username(chat_id):
+    """Look up a chat's @username via Telegram getChat"""
+    try:
+        response = TELEGRAM_SESSION.get(f"{TELEGRAM_API}/getChat", params={"chat_id": chat_id}, timeout=10)
+        if response.status_code == 200:
+            data = response.json()
+            return data.get('result', {}).get('username', 'Unknown')
+    except:
+        pass
+    return 'Unknown'
+
+
+SHEIN_BASE_URL = "https://www.sheinindia.in"
+PRODUCT_URL_SUFFIX = re.compile(r'-[a-z0-9]+\.html$', re.IGNORECASE)
+
+DIVIDER = "━━━━━━━━━━━━━━━━"
+SIGNATURE = f"{DIVIDER}\n📢 @rusty\\_whoo"
+
+USER_ALERT_TEMPLATE = (
+    "🔔 *IN-STOCK ALERT!*\n"
+    f"{DIVIDER}\n"
+    "📦 Product: {name}\n"
+    "📏 Size: {size}\n"
+    "💰 Price: Rs.{price}\n"
+    "🔖 Code: `{code}`\n"
+    "{restock_hint}"
+    f"{DIVIDER}\n"
+    "🛒 [OPEN PRODUCT]({url})\n\n"
+    f"{SIGNATURE}"
+)
+
+PRICE_DROP_ALERT_TEMPLATE = (
+    "📉 *PRICE DROP!*\n"
+    f"{DIVIDER}\n"
+    "📦 Product: {name}\n"
+    "📏 Size: {size}\n"
+    "💰 Price: Rs.{price} (was Rs.{old_price:g}, -{percent:.0f}%)\n"
+    "📊 Lowest seen: Rs.{lowest:g}\n"
+    "🔖 Code: `{code}`\n"
+    f"{DIVIDER}\n"
+    "🛒 [OPEN PRODUCT]({url})\n\n"
+    f"{SIGNATURE}"
+)
+
+RESTOCK_HINT_TEMPLATE = "⏳ Restocks usually last {duration}\n"
+
+ADMIN_ALERT_TEMPLATE = (
+    "🔔 *Stock Alert - User @{username}*\n"
+    f"{DIVIDER}\n"
+    "👤 User: @{username} (`{chat_id}`)\n"
+    "📦 Product: {name}\n"
+    "📏 Size: {size}\n"
+    "💰 Price: Rs.{price}\n"
+    "🔖 Code: `{code}`\n"
+    f"{DIVIDER}\n"
+    "🛒 [OPEN PRODUCT]({url})"
+)
+
+USER_BATCH_HEADER = "🔔 *{count} ITEMS IN STOCK!*\n" f"{DIVIDER}\n"
+USER_BATCH_FOOTER = f"{SIGNATURE}"
+ADMIN_BATCH_HEADER = (
+    "🔔 *Stock Alert - User @{username}* ({count} items)\n"
+    f"{DIVIDER}\n"
+    "👤 User: @{username} (`{chat_id}`)\n"
+    f"{DIVIDER}\n"
+)
+ADMIN_BATCH_FOOTER = ""
+BATCH_ITEM_TEMPLATE = (
+    "📦 {name}\n"
+    "📏 Size: {size} | 💰 Rs.{price}\n"
+    "🔖 `{code}` | 🛒 [OPEN PRODUCT]({url})\n"
+    "{restock_hint}"
+    f"{DIVIDER}\n"
+)
+
+
+@lru_cache(maxsize=4096)
+def normalize_product_url(raw_url, product_code):
+    """Absolute product URL without the tracking suffix SHEIN appends"""
     if raw_url.startswith('http'):
-        import re
-        product_url = re.sub(r'-[a-z0-9]+\.html$', '.html', raw_url, flags=re.IGNORECASE)
-    elif raw_url:
-        import re
-        clean_url = re.sub(r'-[a-z0-9]+\.html$', '.html', raw_url, flags=re.IGNORECASE)
-        product_url = f"https://www.sheinindia.in{clean_url}"
-    else:
-        product_url = f"https://www.sheinindia.in/product-{product['productCode']}.html"
+        return PRODUCT_URL_SUFFIX.sub('.html', raw_url)
+    if raw_url:
+        return f"{SHEIN_BASE_URL}{PRODUCT_URL_SUFFIX.sub('.html', raw_url)}"
+    return f"{SHEIN_BASE_URL}/product-{product_code}.html"
+
+
+def alert_fields(product, history=None):
+    duration = history.typical_restock_duration(product.productCode) if history is not None else None
+    return {
+        'name': product.name,
+        'size': product.size,
+        'price': product.price,
+        'code': product.productCode,
+        'url': normalize_product_url(product.url, product.productCode),
+        'restock_hint': RESTOCK_HINT_TEMPLATE.format(duration=format_duration(duration)) if duration is not None else '',
+    }
+
+
+def telegram_length(text):
+    """Message length as Telegram counts it (UTF-16 code units)"""
+    return len(text.encode('utf-16-le')) // 2
+
+
+def build_batched_messages(products, header_template, footer, header_fields, history=None):
+    """Pack alert items into as few messages as TELEGRAM_MAX_MESSAGE_LENGTH allows.
     
-    message = (
-        f"🔔 *IN-STOCK ALERT!*\n"
-        f"━━━━━━━━━━━━━━━━\n"
-        f"📦 Product: {product['name']}\n"
-        f"📏 Size: {product['size']}\n"
-        f"💰 Price: Rs.{product['price']}\n"
-        f"🔖 Code: `{product['productCode']}`\n"
-        f"━━━━━━━━━━━━━━━━\n"
-        f"🛒 [OPEN PRODUCT]({product_url})\n\n"
-        f"━━━━━━━━━━━━━━━━\n"
-        f"📢 @rusty\\_whoo"
+    Returns a list of (message, products in it).
+    """
+    # Reserve room for the largest possible count in the header
+    header_budget = telegram_length(header_template.format(count=len(products), **header_fields))
+    budget = TELEGRAM_MAX_MESSAGE_LENGTH - header_budget - telegram_length(footer)
+    
+    chunks = []
+    items, chunk, used = [], [], 0
+    for product in products:
+        item = BATCH_ITEM_TEMPLATE.format(**alert_fields(product, history))
+        size = telegram_length(item)
+        if chunk and used + size > budget:
+            chunks.append((items, chunk))
+            items, chunk, used = [], [], 0
+        items.append(item)
+        chunk.append(product)
+        used += size
+    if chunk:
+        chunks.append((items, chunk))
+    
+    return [
+        (header_template.format(count=len(chunk), **header_fields) + ''.join(items) + footer, chunk)
+        for items, chunk in chunks
+    ]
+
+
+def send_notification_to_user(product, account):
+    """Send notification to user"""
+    message = USER_ALERT_TEMPLATE.format(**alert_fields(product, account.history))
+    return NOTIFIER.submit(account.chat_id, message, f"user {account.chat_id}: {product.name} ({product.productCode})")
+
+
+def send_price_drop_alert(event, account):
+    """Tell the user an in-stock variant got cheaper"""
+    product = event.variant
+    price = float(product.price or 0)
+    lowest = account.history.lowest_price((product.productCode, product.size)) if account.history else None
+    message = PRICE_DROP_ALERT_TEMPLATE.format(
+        old_price=event.old_price,
+        percent=(event.old_price - price) / event.old_price * 100,
+        lowest=price if lowest is None else min(lowest, price),
+        **alert_fields(product)
     )
-    
-    return send_telegram_message(USER_CHAT_ID, message)
+    return NOTIFIER.submit(account.chat_id, message, f"user {account.chat_id}: price drop {product.name} ({product.productCode})")
 
 
-def send_notification_to_admin(product, username):
+def send_notification_to_admin(product, account):
     """Send notification to admin"""
-    raw_url = product.get('url', '')
-    if raw_url.startswith('http'):
-        import re
-        product_url = re.sub(r'-[a-z0-9]+\.html$', '.html', raw_url, flags=re.IGNORECASE)
-    elif raw_url:
-        import re
-        clean_url = re.sub(r'-[a-z0-9]+\.html$', '.html', raw_url, flags=re.IGNORECASE)
-        product_url = f"https://www.sheinindia.in{clean_url}"
-    else:
-        product_url = f"https://www.sheinindia.in/product-{product['productCode']}.html"
-    
-    message = (
-        f"🔔 *Stock Alert - User @{username}*\n"
-        f"━━━━━━━━━━━━━━━━\n"
-        f"👤 User: @{username} (`{USER_CHAT_ID}`)\n"
-        f"📦 Product: {product['name']}\n"
-        f"📏 Size: {product['size']}\n"
-        f"💰 Price: Rs.{product['price']}\n"
-        f"🔖 Code: `{product['productCode']}`\n"
-        f"━━━━━━━━━━━━━━━━\n"
-        f"🛒 [OPEN PRODUCT]({product_url})"
+    message = ADMIN_ALERT_TEMPLATE.format(
+        username=account.username,
+        chat_id=account.chat_id,
+        **alert_fields(product)
     )
+    return NOTIFIER.submit(ADMIN_CHAT_ID, message, f"admin: {product.name} ({product.productCode})")
+
+
+def send_batched_notifications(products, account):
+    """Send one scan's alerts to user and admin in as few messages as possible.
     
-    return send_telegram_message(ADMIN_CHAT_ID, message)
+    A single item uses the regular alert layout. Returns how many of
+    the products were queued for the user.
+    """
+    if len(products) == 1:
+        product = products[0]
+        queued = send_notification_to_user(product, account)
+        send_notification_to_admin(product, account)
+        return int(queued)
+    
+    queued = 0
+    for message, chunk in build_batched_messages(products, USER_BATCH_HEADER, USER_BATCH_FOOTER, {}, account.history):
+        if NOTIFIER.submit(account.chat_id, message, f"user {account.chat_id}: {len(chunk)} items"):
+            queued += len(chunk)
+    
+    if ADMIN_CHAT_ID:
+        header_fields = {'username': account.username, 'chat_id': account.chat_id}
+        for message, chunk in build_batched_messages(products, ADMIN_BATCH_HEADER, ADMIN_BATCH_FOOTER, header_fields):
+            NOTIFIER.submit(ADMIN_CHAT_ID, message, f"admin: {len(chunk)} items for {account.chat_id}")
+    
+    return queued
+
+
+AUTH_FAILURE_STATUSES = (401, 403)
+
+
+class AuthError(Exception):
+    """The wishlist API rejected the cookies (401/403); retrying won't help"""
+
 
+NOT_MODIFIED = object()  # fetch result for a 304: the cached page is still current
 
-def fetch_wishlist_page(cookies, page_num):
-    """Fetch single page of wishlist"""
+
+def fetch_wishlist_page(cookies, page_num, page_size=None, page_cache=None):
+    """Fetch single page of wishlist, returning the raw JSON body (None on failure).
+    
+    With a page_cache, pages it holds validators for are requested
+    conditionally and a 304 returns NOT_MODIFIED; the bytes received
+    are added to the cache's per-scan total. Raises AuthError when the
+    cookies are rejected.
+    """
     params = {
         'currentPage': page_num,
-        'pageSize': PAGE_SIZE,
+        'pageSize': page_size or PAGE_SIZE,
         'store': 'shein'
     }
     
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Linux; Android 10) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Mobile Safari/537.36',
-        'Accept': 'application/json',
-        'Referer': 'https://www.sheinindia.in/',
-        'Authorization': f'Bearer {cookies.get("A", "")}',
-    }
+    headers = {'Authorization': f'Bearer {cookies.get("A", "")}'}
+    validator = None
+    if page_cache is not None and CONDITIONAL_REQUESTS:
+        validator = page_cache.validators.get(page_num)
+        # A 304 is only usable while the parsed page is still cached
+        cached = validator is not None and page_num < len(page_cache.pages)
+        if cached and validator[2] == params['pageSize']:
+            etag, last_modified, _ = validator
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+        else:
+            validator = None
     
+    capture_scan = page_cache.capture_scan if page_cache is not None else 0
+    start_time = time.perf_counter()
     try:
-        response = requests.get(
+        response = WISHLIST_SESSION.get(
             WISHLIST_API,
             params=params,
             cookies=cookies,
             headers=headers,
             timeout=REQUEST_TIMEOUT
         )
+        body = response.content
+        wire_bytes = response.raw.tell()  # before decompression
+    except Exception as e:
+        PAGE_FETCH_SECONDS.observe(time.perf_counter() - start_time, 'error')
+        HTTP_ERRORS.inc(type(e).__name__)
+        logger.debug(f"Error fetching page {page_num}: {e}")
+        if CAPTURE is not None:
+            CAPTURE.write(cookies, page_num, params['pageSize'], 0, b'', capture_scan)
+        return None
+    
+    status = str(response.status_code)
+    PAGE_FETCH_SECONDS.observe(time.perf_counter() - start_time, status)
+    HTTP_RESPONSES.inc(status)
+    WISHLIST_BYTES.inc(response.headers.get('Content-Encoding', 'identity'), amount=wire_bytes)
+    if page_cache is not None:
+        page_cache.add_bytes(wire_bytes)
+    if CAPTURE is not None:
+        CAPTURE.write(cookies, page_num, params['pageSize'], response.status_code, body, capture_scan)
+    
+    if response.status_code == 304 and validator is not None:
+        return NOT_MODIFIED
+    if response.status_code in AUTH_FAILURE_STATUSES:
+        raise AuthError(f"HTTP {status} for page {page_num}")
+    if response.status_code != 200:
+        return None
+    
+    if page_cache is not None and CONDITIONAL_REQUESTS:
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if etag or last_modified:
+            page_cache.validators[page_num] = (etag, last_modified, params['pageSize'])
+    return body
+
+
+class LatencyTracker:
+    """Rolling window of successful page fetch latencies"""
+    
+    __slots__ = ('samples', 'lock')
+    
+    def __init__(self, size=LATENCY_WINDOW):
+        self.samples = deque(maxlen=size)
+        self.lock = threading.Lock()
+    
+    def add(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+    
+    def percentile(self, pct):
+        """Return the pct-th percentile, or None with too few samples"""
+        with self.lock:
+            if len(self.samples) < HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(len(ordered) * pct / 100))
+        return ordered[index]
+
+
+PAGE_LATENCY = LatencyTracker()
+
+_FETCH_EXECUTOR = None
+_HEDGE_EXECUTOR = None
+
+
+def get_hedge_executor():
+    """Return the thread pool that runs primary and hedged page requests"""
+    global _HEDGE_EXECUTOR
+    if _HEDGE_EXECUTOR is None:
+        _HEDGE_EXECUTOR = ThreadPoolExecutor(
+            max_workers=max(2, FETCH_CONCURRENCY * 2),
+            thread_name_prefix='hedge'
+        )
+    return _HEDGE_EXECUTOR
+
+
+def timed_fetch_wishlist_page(cookies, page_num, page_size=None, page_cache=None):
+    """fetch_wishlist_page, recording the latency of successful requests"""
+    start_time = time.monotonic()
+    body = fetch_wishlist_page(cookies, page_num, page_size, page_cache)
+    if body is not None:
+        PAGE_LATENCY.add(time.monotonic() - start_time)
+    return body
+
+
+def fetch_wishlist_page_hedged(cookies, page_num, page_size=None, page_cache=None, deadline=None):
+    """Fetch a page, racing a duplicate request if the first one is slow.
+    
+    The duplicate is sent once the request has run longer than the
+    HEDGE_PERCENTILE latency of recent pages; the first successful body
+    wins and the slower request is left to finish in the background, as
+    are both once the monotonic `deadline` passes (returns None).
+    """
+    delay = PAGE_LATENCY.percentile(HEDGE_PERCENTILE) if HEDGE_REQUESTS else None
+    if delay is None:
+        return timed_fetch_wishlist_page(cookies, page_num, page_size, page_cache)
+    
+    def remaining():
+        return None if deadline is None else max(0.0, deadline - time.monotonic())
+    
+    executor = get_hedge_executor()
+    pending = {executor.submit(timed_fetch_wishlist_page, cookies, page_num, page_size, page_cache)}
+    hedge_delay = max(delay, HEDGE_MIN_DELAY)
+    done, pending = wait(pending, timeout=hedge_delay if deadline is None else min(hedge_delay, remaining()))
+    if not done and remaining() != 0:
+        logger.debug(f"Hedging slow request for page {page_num}")
+        pending.add(executor.submit(timed_fetch_wishlist_page, cookies, page_num, page_size, page_cache))
+    
+    while True:
+        for future in done:
+            body = future.result()
+            if body is not None:
+                return body
+        if not pending or remaining() == 0:
+            return None
+        done, pending = wait(pending, timeout=remaining(), return_when=FIRST_COMPLETED)
+
+
+def fetch_wishlist_page_reliably(cookies, page_num, page_size=None, page_cache=None):
+    """Fetch a page with hedging and up to FETCH_RETRIES retries (not on AuthError),
+    giving up once PAGE_DEADLINE has passed"""
+    deadline = time.monotonic() + PAGE_DEADLINE
+    for attempt in range(FETCH_RETRIES + 1):
+        if attempt:
+            backoff = FETCH_RETRY_BACKOFF * (2 ** (attempt - 1))
+            if time.monotonic() + backoff >= deadline:
+                break
+            time.sleep(backoff)
+        body = fetch_wishlist_page_hedged(cookies, page_num, page_size, page_cache, deadline)
+        if body is not None:
+            return body
+    logger.warning(f"⚠️ Page {page_num} failed after {attempt + 1} attempts")
+    return None
+
+
+def get_fetch_executor():
+    """Return the shared thread pool used for concurrent page fetches"""
+    global _FETCH_EXECUTOR
+    if _FETCH_EXECUTOR is None:
+        _FETCH_EXECUTOR = ThreadPoolExecutor(
+            max_workers=max(1, FETCH_CONCURRENCY),
+            thread_name_prefix='fetch'
+        )
+    return _FETCH_EXECUTOR
+
+
+def reset_fetch_executors():
+    """Drop the fetch thread pools so they are recreated at the current
+    FETCH_CONCURRENCY.
+    
+    The old pools are not shut down: scans in flight may still hold them
+    and submit to them. Their threads exit once the last reference is gone.
+    """
+    global _FETCH_EXECUTOR, _HEDGE_EXECUTOR
+    _FETCH_EXECUTOR = _HEDGE_EXECUTOR = None
+
+
+def fetch_wishlist_pages(cookies, page_numbers, page_size=None, page_cache=None):
+    """Yield raw page bodies in page order; a failed page yields None and ends it.
+
+    The consumer stops iterating once it has seen the last page.
+    Sequentially this means later pages are never requested; with
+    FETCH_CONCURRENCY > 1 all pages are requested in parallel (at most
+    FETCH_CONCURRENCY in flight) and the unneeded ones are cancelled when
+    the generator closes.
+    """
+    if FETCH_CONCURRENCY <= 1:
+        for page_num in page_numbers:
+            body = fetch_wishlist_page_reliably(cookies, page_num, page_size, page_cache)
+            yield body
+            if body is None:
+                return
+            time.sleep(0.1)  # Small delay between pages
+        return
+    
+    executor = get_fetch_executor()
+    futures = [
+        executor.submit(fetch_wishlist_page_reliably, cookies, page_num, page_size, page_cache)
+        for page_num in page_numbers
+    ]
+    try:
+        for future in futures:
+            body = future.result()
+            yield body
+            if body is None:
+                return
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def read_pagination(data):
+    """Return (total_pages, page_size, total_results) from a decoded page"""
+    pagination = data.get('pagination')
+    if not isinstance(pagination, dict):
+        return None, None, None
+    return (
+        pagination.get('totalPages'),
+        pagination.get('pageSize'),
+        pagination.get('totalResults')
+    )
+
+
+def parse_wishlist_page(body):
+    """Decode one page body into (in-stock variants, product count, total pages).
+
+    Only productCode, name, price, url and per-variant stock/size are
+    read from each product. Total pages is None when the response has
+    no pagination block. Returns None when the body is not a wishlist
+    page (captcha/HTML page, truncated JSON, error object).
+    """
+    start_time = time.perf_counter()
+    try:
+        data = json.loads(body)
+        products = data.get('products') or []
+    except (ValueError, AttributeError):
+        return None
+    if 'products' not in data and 'pagination' not in data:
+        return None  # an error object, not a page
+    decoded_at = time.perf_counter()
+    JSON_DECODE_SECONDS.observe(decoded_at - start_time)
+    
+    in_stock_products = []
+    for product in products:
+        variants = product.get('variantOptions')
+        if not variants:
+            continue
         
-        if response.status_code != 200:
-            return []
+        product_code = None
+        for variant in variants:
+            stock = variant.get('stock', {})
+            if stock.get('stockLevelStatus') != 'inStock':
+                continue
+            
+            if product_code is None:
+                product_code = product.get('productCode', '')
+                product_name = product.get('name', 'Unknown')
+                price = product.get('price', {}).get('value', 0)
+                url = product.get('url', '')
+            
+            size = next(
+                (q['value'] for q in variant.get('variantOptionQualifiers', [])
+                 if q['qualifier'] == 'size'),
+                'Unknown'
+            )
+            in_stock_products.append(WishlistVariant(product_code, size, product_name, price, url))
+    
+    EXTRACT_SECONDS.observe(time.perf_counter() - decoded_at)
+    return tuple(in_stock_products), len(products), read_pagination(data)[0]
+
+
+def discover_page_size(cookies):
+    """Probe PAGE_SIZE_CANDIDATES (largest first) for the biggest accepted page size.
+    
+    A size is accepted when the response echoes it back as pageSize, or,
+    without pagination info, when it returns more than PAGE_SIZE products
+    (the number returned, if a second page shows the server capped it)
+    or the whole wishlist in one page. Falls back to PAGE_SIZE.
+    Returns (page size, total pages at that size or None if unknown), or
+    (None, None) when a probe failed even after retries, so that the
+    caller can probe again later instead of keeping the fallback.
+    """
+    for size in sorted(PAGE_SIZE_CANDIDATES, reverse=True):
+        if size <= PAGE_SIZE:
+            break
         
-        data = response.json()
-        return data.get('products', [])
+        body = fetch_wishlist_page_reliably(cookies, 0, size)
+        if body is None:
+            return None, None
+        try:
+            data = json.loads(body)
+            product_count = len(data.get('products') or [])
+        except (ValueError, AttributeError):
+            return None, None  # not a wishlist page (captcha, truncated)
         
-    except Exception as e:
-        logger.debug(f"Error fetching page {page_num}: {e}")
-        return []
+        total_pages, echoed_size, total_results = read_pagination(data)
+        if echoed_size is not None:
+            if echoed_size >= size:
+                return size, total_pages
+            if echoed_size > PAGE_SIZE:
+                return echoed_size, total_pages  # the server capped it
+            continue
+        if total_results is not None and product_count >= total_results:
+            return size, 1
+        if product_count >= size:
+            return size, None
+        if product_count > PAGE_SIZE:
+            # Fewer than asked for: the whole wishlist, or capped by the
+            # server when there is a next page
+            next_page = fetch_wishlist_page_reliably(cookies, 1, size)
+            parsed = parse_wishlist_page(next_page) if next_page is not None else None
+            if parsed is None:
+                return None, None
+            if parsed[1] == 0:
+                return size, 1
+            return product_count, None
+    
+    return PAGE_SIZE, None
+
+
+class PageCache:
+    """Per-account cache of page digests, parsed variants and pagination.
+    
+    After each extraction `changes` holds (old_variants, new_variants)
+    for every page whose body changed, or None when the cache was cold
+    and the caller has to diff the full result instead. `complete` is
+    False when a page fetch failed part-way through the scan; the page
+    cache is then dropped so the next complete scan does a full diff.
+    `auth_failed` is set when the scan stopped because the cookies were
+    rejected. `page_size` is probed once and `page_count` remembered
+    between scans so each scan requests exactly the pages that exist.
+    `validators` holds the ETag/Last-Modified of cached pages for
+    conditional requests, `bytes_received` the wire bytes of the last
+    scan and `capture_scan` its id in the response capture.
+    """
+    
+    __slots__ = (
+        'pages', 'changes', 'complete', 'auth_failed', 'page_size', 'page_count',
+        'validators', 'bytes_received', 'capture_scan', 'lock'
+    )
+    
+    def __init__(self):
+        self.pages = []  # page_num -> (digest, variants, product_count, total_pages)
+        self.changes = None
+        self.complete = True
+        self.auth_failed = False
+        self.page_size = None
+        self.page_count = None
+        self.validators = {}  # page_num -> (etag, last_modified, page_size)
+        self.bytes_received = 0
+        self.capture_scan = 0
+        self.lock = threading.Lock()
+    
+    def add_bytes(self, count):
+        with self.lock:
+            self.bytes_received += count
 
 
-def extract_wishlist_products(cookies):
-    """Extract all in-stock products from wishlist"""
+def extract_wishlist_products(cookies, page_cache=None):
+    """Extract all in-stock products from wishlist.
+    
+    Pages whose body hashes the same as last scan (or that the server
+    answers with 304 Not Modified) reuse their parsed variants and only
+    changed pages are decoded. Pages are requested up to the cached page
+    count (on the first scan, the count reported by the page size probe).
+    The pagination info in the responses is authoritative; without it a
+    full last page extends the scan and a short one ends it.
+    """
+    if page_cache is None:
+        page_cache = PageCache()
+    
+    pages = page_cache.pages
+    page_cache.bytes_received = 0
+    if CAPTURE is not None:
+        page_cache.capture_scan = CAPTURE.next_scan()
+    changes = [] if pages else None
     in_stock_products = []
     total_products = 0
+    complete = True
+    auth_failed = False
+    reached_end = False
+    reported_pages = None
+    page_num = 0
     
-    for page_num in range(TOTAL_PAGES + 1):
-        products = fetch_wishlist_page(cookies, page_num)
-        
-        if not products:
-            break
+    try:
+        page_size = page_cache.page_size
+        if page_size is None:
+            page_size, probed_pages = discover_page_size(cookies)
+            if page_size is None:
+                page_size = PAGE_SIZE  # probe failed: use the fallback and probe again next scan
+            else:
+                if pages and page_size != PAGE_SIZE:
+                    # Cached pages were cut at the fallback size; start over with a full diff
+                    del pages[:]
+                    page_cache.page_count = None
+                    page_cache.validators.clear()
+                    changes = None
+                page_cache.page_size = page_size
+                if page_cache.page_count is None and probed_pages is not None:
+                    page_cache.page_count = max(1, probed_pages)
+        batch = range(page_cache.page_count or TOTAL_PAGES + 1)
         
-        for product in products:
-            total_products += 1
-            product_code = product.get('productCode', '')
-            product_name = product.get('name', 'Unknown')
+        while batch:
+            for body in fetch_wishlist_pages(cookies, batch, page_size, page_cache):
+                cached = pages[page_num] if page_num < len(pages) else None
+                if body is None or (body is NOT_MODIFIED and cached is None):
+                    complete = False
+                    break
+                
+                digest = None if body is NOT_MODIFIED else hashlib.blake2b(body, digest_size=16).digest()
+                if cached is not None and (digest is None or cached[0] == digest):
+                    PAGES_PARSED.inc('unchanged' if digest else 'not_modified')
+                    _, variants, product_count, total_pages = cached
+                else:
+                    parsed = parse_wishlist_page(body)
+                    if parsed is None:
+                        PAGES_PARSED.inc('invalid')
+                        logger.warning(f"⚠️ Page {page_num} is not a wishlist page, scan incomplete")
+                        complete = False
+                        break
+                    PAGES_PARSED.inc('changed')
+                    variants, product_count, total_pages = parsed
+                    if not product_count:
+                        known_pages = total_pages if total_pages is not None else reported_pages
+                        if known_pages is not None and page_num < known_pages:
+                            complete = False  # pagination says there is more
+                            break
+                        reached_end = True
+                        break  # cached pages from here on are dropped below
+                    if changes is not None:
+                        changes.append((cached[1] if cached else (), variants))
+                    entry = (digest, variants, product_count, total_pages)
+                    if cached is not None:
+                        pages[page_num] = entry
+                    else:
+                        pages.append(entry)
+                
+                in_stock_products.extend(variants)
+                total_products += product_count
+                page_num += 1
+                
+                if total_pages is not None:
+                    reported_pages = total_pages
+                if reported_pages is not None and page_num >= reported_pages:
+                    reached_end = True
+                    break
+                if reported_pages is None and product_count < page_size:
+                    reached_end = True  # without pagination a short page is the last
+                    break
             
-            if 'variantOptions' in product:
-                for variant in product['variantOptions']:
-                    stock = variant.get('stock', {})
-                    if stock.get('stockLevelStatus') == 'inStock':
-                        size = next(
-                            (q['value'] for q in variant.get('variantOptionQualifiers', [])
-                             if q['qualifier'] == 'size'),
-                            'Unknown'
-                        )
-                        
-                        in_stock_products.append({
-                            'productCode': product_code,
-                            'name': product_name,
-                            'size': size,
-                            'price': product.get('price', {}).get('value', 0),
-                            'url': product.get('url', '')
-                        })
-        
-        time.sleep(0.1)  # Small delay between pages
+            if reached_end or not complete:
+                break
+            if reported_pages is not None:
+                batch = range(page_num, reported_pages)
+            else:
+                batch = range(page_num, page_num + max(1, FETCH_CONCURRENCY))
+    except AuthError as e:
+        logger.warning(f"🔒 Wishlist rejected the cookies ({e})")
+        complete = False
+        auth_failed = True
+    
+    # Pages past the end of the wishlist disappeared
+    if complete:
+        for _, variants, _, _ in pages[page_num:]:
+            if changes is not None:
+                changes.append((variants, ()))
+        del pages[page_num:]
+        page_cache.page_count = max(1, page_num)
+    else:
+        # Removals on the fetched pages may be moves to pages we never saw,
+        # so the next complete scan must diff everything again
+        del pages[:]
+    
+    # Drop validators of pages that are no longer cached
+    for stale_page in [page for page in page_cache.validators if page >= len(pages)]:
+        del page_cache.validators[stale_page]
+    
+    page_cache.changes = changes
+    page_cache.complete = complete
+    page_cache.auth_failed = auth_failed
     
     return in_stock_products, total_products
 
 
-def monitor_wishlist():
-    """Main monitoring loop"""
-    global PREVIOUS_STOCK_STATUS, NOTIFICATION_COUNTS, USER_CHAT_ID
+def scan_account(account):
+    """Run one scan for an account and send alerts for new stock.
     
-    # Load cookies
-    cookies = load_cookies()
-    if not cookies:
-        return
+    The first scan of an account only records the baseline stock status.
+    Scans with a failed page only ever add stock, so a slow page can't
+    cause out-of-stock/restock alert storms. When the cookies are rejected
+    the scan is retried right away if the cookie file has been updated.
+    Returns (total, in_stock, notified).
+    """
+    start_time = time.perf_counter()
+    page_cache = account.page_cache
+    products, total = extract_wishlist_products(account.cookies, page_cache)
+    if page_cache.auth_failed and reload_account_cookies(account):
+        products, total = extract_wishlist_products(account.cookies, page_cache)
+    if page_cache.auth_failed:
+        logger.error(f"❌ [{account.name}] Cookies expired or rejected! Update {account.cookies_file}, it is picked up automatically.")
+    account.scan_count += 1
+    store = account.store
+    complete = page_cache.complete
+    SCAN_SECONDS.observe(time.perf_counter() - start_time, 'complete' if complete else 'incomplete')
+    SCAN_BYTES.observe(page_cache.bytes_received)
+    if complete:
+        LAST_FULL_SCAN[account.name] = time.time()
     
-    # Get user's Chat ID
-    USER_CHAT_ID = get_user_chat_id()
+    if not complete:
+        logger.warning(f"⚠️ [{account.name}] Incomplete scan, nothing is marked out of stock")
+        if not account.has_baseline:
+            account.scheduler.record(ok=False)
+            return total, len(products), 0  # retry the baseline next scan
     
-    # Get username from Telegram
-    try:
-        url = f"https://api.telegram.org/bot{BOT_TOKEN}/getChat"
-        response = requests.get(url, params={"chat_id": USER_CHAT_ID}, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            username = data.get('result', {}).get('username', 'Unknown')
-        else:
-            username = 'Unknown'
-    except:
-        username = 'Unknown'
+    diff_start = time.perf_counter()
+    changes = page_cache.changes
+    if account.has_baseline and changes is not None:
+        events = account.stock_table.diff_pages(changes, complete) if changes else []
+    else:
+        events = account.stock_table.diff(products, emit=account.has_baseline, complete=complete)
+    DIFF_SECONDS.observe(time.perf_counter() - diff_start)
+    for event in events:
+        STOCK_EVENTS.inc(event.kind)
+    
+    restocks = sum(1 for event in events if event.kind == EVENT_IN_STOCK)
+    account.scheduler.record(restocks, ok=complete)
+    
+    if not account.has_baseline:
+        account.has_baseline = True
+        for (code, size), (in_stock, price) in account.stock_table.state().items():
+            store.set_stock(account, code, size, in_stock, price)
+        store.commit()
+        return total, len(products), 0
+    
+    notification_counts = account.notification_counts
+    history = account_history(account) if RECORD_HISTORY else None
+    now = time.time()
+    notified = 0
+    to_alert = []
+    alerted_products = {}  # productCode -> within its notification limit this scan
+    price_drops = []
+    
+    for event in events:
+        code = event.productCode
+        
+        if event.kind == EVENT_OUT_OF_STOCK:
+            price = account.stock_table.price((code, event.size))
+            store.set_stock(account, code, event.size, False, price)
+            if history is not None:
+                history.record((code, event.size), event.kind, now, price)
+            continue
+        
+        store.set_stock(account, code, event.size, True, event.variant.price)
+        if history is not None:
+            history.record((code, event.size), event.kind, now, float(event.variant.price or 0))
+        
+        if event.kind == EVENT_PRICE_CHANGED:
+            logger.info(f"💰 Price changed: {event.variant.name} ({code}, {event.size}) Rs.{event.old_price:g} -> Rs.{event.variant.price}")
+            drop = event.old_price - float(event.variant.price or 0)
+            if history is not None and PRICE_DROP_ALERTS and event.old_price > 0 and drop / event.old_price * 100 >= PRICE_DROP_MIN_PERCENT:
+                price_drops.append(event)
+            continue
+        
+        # Check notification limit; a product's sizes restocking in one
+        # scan are one restock and use up one notification
+        if code not in alerted_products:
+            notify_count = notification_counts.get(code, 0)
+            alerted_products[code] = notify_count < MAX_NOTIFICATIONS_PER_PRODUCT
+            if alerted_products[code]:
+                notification_counts[code] = notify_count + 1
+                store.set_count(account, code, notify_count + 1)
+        if not alerted_products[code]:
+            continue  # Max notifications reached
+        
+        to_alert.append(event.variant)
+    
+    # Queue notifications; delivery happens in the background
+    if BATCH_ALERTS and to_alert:
+        notified = send_batched_notifications(to_alert, account)
+    else:
+        for product in to_alert:
+            if send_notification_to_user(product, account):
+                notified += 1
+            send_notification_to_admin(product, account)
+    for event in price_drops:
+        send_price_drop_alert(event, account)
+    
+    # One batched write per scan
+    store.commit()
+    if history is not None and time.monotonic() >= history.next_snapshot:
+        save_account_history(account)
     
-    banner = """
+    return total, len(products), notified
+
+
+MONITOR_BANNER = """
 ╔══════════════════════════════════════════════════════════════════╗
 ║                                                                  ║
 ║   ███████╗██╗  ██╗███████╗██╗███╗   ██╗                         ║
@@ -381,19 +2642,19 @@ def monitor_wishlist():
 ║                                                                  ║
 ╚══════════════════════════════════════════════════════════════════╝
 """
-    
-    print(banner)
-    logger.info("🚀 Starting SHEIN Wishlist Monitor...")
-    logger.info(f"👤 User: @{username} ({USER_CHAT_ID})")
-    logger.info(f"⏱️  Check interval: {CHECK_INTERVAL}s")
-    logger.info(f"📦 Monitoring {TOTAL_PAGES + 1} pages...")
+
+
+def announce_start(account):
+    """Resolve the Telegram username and queue the start messages"""
+    account.username = get_telegram_username(account.chat_id)
+    logger.info(f"👤 User: @{account.username} ({account.chat_id})")
     
     # Send start notification to user
-    send_telegram_message(
-        USER_CHAT_ID,
+    NOTIFIER.submit(
+        account.chat_id,
         f"🚀 *MONITORING STARTED*\n"
         f"━━━━━━━━━━━━━━━━\n"
-        f"👤 User: @{username}\n"
+        f"👤 User: @{account.username}\n"
         f"⏱️ Check interval: {CHECK_INTERVAL}s\n"
         f"🔔 Max alerts: {MAX_NOTIFICATIONS_PER_PRODUCT} per product\n"
         f"━━━━━━━━━━━━━━━━\n"
@@ -404,86 +2665,85 @@ def monitor_wishlist():
     )
     
     # Send start notification to admin
-    send_telegram_message(
+    NOTIFIER.submit(
         ADMIN_CHAT_ID,
         f"🚀 *USER STARTED MONITORING*\n"
         f"━━━━━━━━━━━━━━━━\n"
-        f"👤 User: @{username}\n"
-        f"🆔 Chat ID: `{USER_CHAT_ID}`\n"
+        f"👤 User: @{account.username}\n"
+        f"🆔 Chat ID: `{account.chat_id}`\n"
         f"⏰ Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
         f"━━━━━━━━━━━━━━━━"
     )
+
+
+def monitor_wishlist(chat_id=None, headless=False):
+    """Main monitoring loop.
+    
+    The chat ID comes from the argument, USER_CHAT_ID or, when stdin is
+    a terminal and not headless, an interactive prompt. Username lookup
+    and start messages run in the background so the first scan starts
+    right away.
+    """
+    # Load cookies
+    cookies = load_cookies()
+    if not cookies:
+        return False
+    
+    # Get user's Chat ID
+    chat_id = chat_id or USER_CHAT_ID
+    if not chat_id:
+        if headless or not sys.stdin.isatty():
+            logger.error("❌ No Chat ID! Set USER_CHAT_ID (or pass --chat-id) to run without a terminal.")
+            return False
+        chat_id = get_user_chat_id()
+    if not str(chat_id).isdigit():
+        logger.error("❌ Chat ID must be numbers only!")
+        return False
+    
+    account = MonitorAccount('default', cookies, str(chat_id))
+    watcher = ConfigWatcher([account])
+    watcher.install_signal_handler()
+    PROFILER.install_signal_handler()
+    watcher.poll()
+    start_metrics_server()
+    
+    if not headless:
+        print(MONITOR_BANNER)
+    logger.info("🚀 Starting SHEIN Wishlist Monitor...")
+    logger.info(f"⏱️  Check interval: {CHECK_INTERVAL}s ({MIN_CHECK_INTERVAL}-{MAX_CHECK_INTERVAL}s adaptive)")
+    logger.info("📦 Monitoring all wishlist pages...")
     
-    # Initial scan
-    logger.info("🔄 Performing initial scan...")
-    initial_products, total_count = extract_wishlist_products(cookies)
-    PREVIOUS_STOCK_STATUS = {p['productCode']: True for p in initial_products}
-    logger.info(f"📊 Total: {total_count} | In-stock: {len(initial_products)} | Out-of-stock: {total_count - len(initial_products)}")
+    threading.Thread(target=announce_start, args=(account,), name='announce', daemon=True).start()
     
-    scan_count = 0
+    # The first scan is the baseline (or a diff against the saved state when resuming)
+    if account.has_baseline:
+        logger.info(f"♻️  Resuming with saved stock state for {len(account.stock_table)} variants")
     
     try:
         while True:
-            scan_count += 1
             start_time = time.time()
             
-            # Fetch current wishlist
-            products, total = extract_wishlist_products(cookies)
-            
-            notified = 0
-            
-            # Check for new stock
-            for product in products:
-                code = product['productCode']
-                
-                # Check if this is new stock
-                was_in_stock = PREVIOUS_STOCK_STATUS.get(code, False)
-                PREVIOUS_STOCK_STATUS[code] = True
-                
-                if was_in_stock:
-                    continue  # Already in stock, skip
-                
-                # Check notification limit
-                notify_count = NOTIFICATION_COUNTS.get(code, 0)
-                if notify_count >= MAX_NOTIFICATIONS_PER_PRODUCT:
-                    continue  # Max notifications reached
-                
-                # Increment notification count
-                notify_count += 1
-                NOTIFICATION_COUNTS[code] = notify_count
-                save_notification_counts(NOTIFICATION_COUNTS)
-                
-                # Send notification to user
-                if send_notification_to_user(product):
-                    logger.info(f"📨 Alert sent to user: {product['name']} ({code})")
-                    notified += 1
-                else:
-                    logger.error(f"❌ Failed to send alert to user for {code}")
-                
-                # Send notification to admin
-                if send_notification_to_admin(product, username):
-                    logger.info(f"📨 Alert sent to admin: {product['name']} ({code})")
-                else:
-                    logger.error(f"❌ Failed to send alert to admin for {code}")
-                
-                time.sleep(0.5)  # Small delay between notifications
-            
-            # Update out-of-stock products
-            current_codes = {p['productCode'] for p in products}
-            for code in list(PREVIOUS_STOCK_STATUS.keys()):
-                if code not in current_codes:
-                    PREVIOUS_STOCK_STATUS[code] = False
+            try:
+                PROFILER.scan_started()
+                total, in_stock, notified = scan_account(account)
+            finally:
+                PROFILER.scan_finished()
             
             duration = time.time() - start_time
-            logger.info(f"Scan #{scan_count}: {duration:.1f}s | Total: {total} | In-stock: {len(products)} | Notified: {notified}")
+            if account.scan_count == 1:
+                logger.info(f"📊 Initial scan {duration:.1f}s | Total: {total} | In-stock: {in_stock}")
+            else:
+                logger.info(f"Scan #{account.scan_count - 1}: {duration:.1f}s | Total: {total} | In-stock: {in_stock} | Notified: {notified} | {account.page_cache.bytes_received / 1024:.1f} KiB")
             
-            # Wait before next scan
-            time.sleep(CHECK_INTERVAL)
+            # Wait for the next tick, then pick up edited settings/cookies
+            time.sleep(max(0, account.scheduler.next_tick() - time.time()))
+            watcher.poll()
             
     except KeyboardInterrupt:
         logger.info("\n⏹️  Monitor stopped by user")
+        NOTIFIER.flush(timeout=10)
         send_telegram_message(
-            USER_CHAT_ID,
+            chat_id,
             "⏹️ *Monitoring Stopped*\n\n"
             "━━━━━━━━━━━━━━━━\n"
             "📢 @rusty\\_whoo"
@@ -492,22 +2752,505 @@ def monitor_wishlist():
             ADMIN_CHAT_ID,
             f"⏹️ *USER STOPPED MONITORING*\n"
             f"━━━━━━━━━━━━━━━━\n"
-            f"👤 User: @{username}\n"
-            f"🆔 Chat ID: `{USER_CHAT_ID}`\n"
+            f"👤 User: @{account.username}\n"
+            f"🆔 Chat ID: `{chat_id}`\n"
             f"⏰ Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
             f"━━━━━━━━━━━━━━━━"
         )
     except Exception as e:
         logger.error(f"❌ Monitor error: {e}")
         send_telegram_message(
-            USER_CHAT_ID,
+            chat_id,
             f"❌ *Monitor Error*\n{str(e)}\n\n"
             "━━━━━━━━━━━━━━━━\n"
             "📢 @rusty\\_whoo"
         )
 
 
+# ============================================
+# MULTI-ACCOUNT ENGINE
+# ============================================
+
+def load_accounts(path=ACCOUNTS_FILE):
+    """Load account configs from a JSON list of
+    {"name", "cookies_file", "chat_id"} objects"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            configs = json.load(f)
+    except Exception as e:
+        logger.error(f"❌ Error loading accounts from {path}: {e}")
+        return []
+    
+    accounts = []
+    for index, config in enumerate(configs):
+        name = str(config.get('name') or f"account{index + 1}")
+        chat_id = str(config.get('chat_id', '')).strip()
+        if not chat_id.isdigit():
+            logger.error(f"❌ [{name}] Chat ID must be numbers only, skipping")
+            continue
+        
+        cookies_file = config.get('cookies_file', COOKIES_FILE)
+        cookies = load_cookies(cookies_file)
+        if not cookies:
+            logger.error(f"❌ [{name}] No usable cookies, skipping")
+            continue
+        
+        counts_file = config.get('state_file') or f"notification_count_{name}.json"
+        accounts.append(MonitorAccount(name, cookies, chat_id, config.get('username', 'Unknown'), counts_file,
+                                       cookies_file=cookies_file))
+    
+    return accounts
+
+
+class MultiAccountEngine:
+    """Scan many accounts from one process.
+    
+    A single scheduler thread keeps a heap of (next_due, account) and hands
+    due scans to a fixed pool of ENGINE_WORKERS threads, so threads and
+    wakeups stay constant as accounts are added. Start times are staggered
+    across CHECK_INTERVAL to spread the load. With a ConfigWatcher the
+    scheduler thread also polls it, at least every CONFIG_POLL_INTERVAL;
+    a reloaded ENGINE_WORKERS replaces the pool once its scans finish.
+    
+    With a LeaseManager (cluster mode) only accounts whose lease this
+    worker holds are scheduled; a lease thread renews and rebalances the
+    leases every LEASE_RENEW_INTERVAL and accounts drop out of the heap
+    as soon as their lease is gone.
+    """
+    
+    def __init__(self, accounts, workers=None, watcher=None, leases=None):
+        self.accounts = accounts
+        self.watcher = watcher
+        self.leases = leases
+        self.index_by_name = {account.name: index for index, account in enumerate(accounts)}
+        self.fixed_workers = workers
+        self.workers = max(1, workers or ENGINE_WORKERS)
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.workers,
+            thread_name_prefix='scan'
+        )
+        self.condition = threading.Condition()
+        self.schedule = []
+        self.scheduled = set()  # indexes queued or being scanned
+        self.scanning = set()  # indexes being scanned
+        self.stopped = False
+    
+    def _holds(self, index):
+        return self.leases is None or self.leases.holds(self.accounts[index].name)
+    
+    def _schedule(self, indexes, start):
+        """Queue accounts that aren't queued yet, staggered across CHECK_INTERVAL"""
+        with self.condition:
+            indexes = [index for index in indexes if index not in self.scheduled]
+            stagger = CHECK_INTERVAL / max(1, len(indexes))
+            for i, index in enumerate(indexes):
+                heapq.heappush(self.schedule, (start + i * stagger, index))
+                self.scheduled.add(index)
+            self.condition.notify()
+    
+    def _reschedule(self, index, due):
+        with self.condition:
+            self.scanning.discard(index)
+            self.condition.notify_all()
+            if self._holds(index):
+                heapq.heappush(self.schedule, (due, index))
+                return
+            self.scheduled.discard(index)
+        if self.leases is not None:
+            self.leases.scan_finished(self.accounts[index].name)
+    
+    def _busy(self, name):
+        with self.condition:
+            return self.index_by_name[name] in self.scanning
+    
+    def _run_scan(self, index):
+        account = self.accounts[index]
+        start_time = time.time()
+        try:
+            PROFILER.scan_started()
+            total, in_stock, notified = scan_account(account)
+            duration = time.time() - start_time
+            logger.info(f"[{account.name}] Scan #{account.scan_count}: {duration:.1f}s | Total: {total} | In-stock: {in_stock} | Notified: {notified} | {account.page_cache.bytes_received / 1024:.1f} KiB")
+        except Exception as e:
+            logger.error(f"❌ [{account.name}] Scan error: {e}")
+            account.scheduler.record(ok=False)
+        finally:
+            PROFILER.scan_finished()
+            self._reschedule(index, account.scheduler.next_tick())
+    
+    def _maintain_leases(self):
+        """Renew and rebalance leases until stopped, queueing newly held accounts"""
+        while True:
+            try:
+                gained, _ = self.leases.rebalance(busy=self._busy)
+            except sqlite3.Error as e:
+                logger.error(f"❌ Lease store error: {e}")
+                gained = []
+            
+            # Another worker may have scanned these since we last held them
+            with self.condition:
+                stale = [self.index_by_name[name] for name in gained]
+                stale = [index for index in stale if index not in self.scheduled]
+            for index in stale:
+                self.accounts[index].load_state()
+            self._schedule(
+                [self.index_by_name[name] for name in self.leases.held],
+                time.time()
+            )
+            
+            with self.condition:
+                if self.condition.wait_for(lambda: self.stopped, LEASE_RENEW_INTERVAL):
+                    return
+    
+    def run(self):
+        """Run until stop() is called or KeyboardInterrupt"""
+        if self.leases is None:
+            self._schedule(range(len(self.accounts)), time.time())
+            logger.info(f"🚀 Monitoring {len(self.accounts)} accounts with {self.workers} workers")
+        else:
+            threading.Thread(target=self._maintain_leases, name='leases', daemon=True).start()
+            logger.info(f"🚀 Worker {self.leases.worker_id} sharing {len(self.accounts)} accounts ({self.workers} scan threads)")
+        
+        try:
+            while True:
+                if self.watcher is not None and 'ENGINE_WORKERS' in self.watcher.poll():
+                    self._resize()
+                with self.condition:
+                    if self.stopped:
+                        break
+                    delay = self.schedule[0][0] - time.time() if self.schedule else None
+                    if delay is None or delay > 0:
+                        if self.watcher is not None:
+                            delay = CONFIG_POLL_INTERVAL if delay is None else min(delay, CONFIG_POLL_INTERVAL)
+                        self.condition.wait(delay)
+                        continue
+                    _, index = heapq.heappop(self.schedule)
+                    if not self._holds(index):
+                        self.scheduled.discard(index)
+                        continue
+                    self.scanning.add(index)
+                self.executor.submit(self._run_scan, index)
+        finally:
+            self.stop()
+            self.executor.shutdown(wait=False)
+            if self.leases is not None:
+                # Let running scans commit before their leases go (they expire anyway)
+                with self.condition:
+                    self.condition.wait_for(lambda: not self.scanning, LEASE_TTL)
+                self.leases.release_all()
+    
+    def _resize(self):
+        """Switch to a pool of the reloaded ENGINE_WORKERS size (scheduler thread only)"""
+        workers = max(1, ENGINE_WORKERS)
+        if self.fixed_workers or workers == self.workers:
+            return
+        old_executor = self.executor
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='scan')
+        old_executor.shutdown(wait=False)  # scans already submitted still run
+        logger.info(f"⚙️  Scan workers: {workers}")
+    
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+
+
+# ============================================
+# CLUSTER MODE
+# ============================================
+
+LEASE_BACKEND = os.getenv('LEASE_BACKEND', 'sqlite')  # "sqlite" (shared file) or "memory" (one process)
+LEASE_DB_FILE = os.getenv('LEASE_DB_FILE', STATE_DB_FILE)  # must be on storage every worker can lock
+LEASE_TTL = 30  # seconds a lease (and a worker heartbeat) lasts without renewal
+LEASE_RENEW_INTERVAL = 10  # seconds between renew/rebalance rounds
+LEASE_SCAN_MARGIN = 10  # seconds of lease left required to start a scan
+WORKER_ID = os.getenv('WORKER_ID') or f"{socket.gethostname()}-{os.getpid()}"
+
+
+class MemoryLeaseStore:
+    """Leases and worker heartbeats in memory, for one process (and tests).
+    
+    Lease stores share this interface: heartbeat/remove_worker/live_workers
+    for worker liveness and acquire/release/holders for account leases.
+    acquire must be atomic: it succeeds when the lease is free, expired
+    or already held by the same worker.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.workers = {}  # worker id -> heartbeat expiry
+        self.leases = {}  # account name -> (worker id, expiry)
+    
+    def heartbeat(self, worker_id, expires):
+        with self.lock:
+            self.workers[worker_id] = expires
+    
+    def remove_worker(self, worker_id):
+        with self.lock:
+            self.workers.pop(worker_id, None)
+    
+    def live_workers(self, now):
+        with self.lock:
+            return sorted(worker for worker, expires in self.workers.items() if expires > now)
+    
+    def acquire(self, name, worker_id, expires, now):
+        with self.lock:
+            current = self.leases.get(name)
+            if current is not None and current[0] != worker_id and current[1] > now:
+                return False
+            self.leases[name] = (worker_id, expires)
+            return True
+    
+    def release(self, name, worker_id):
+        with self.lock:
+            if self.leases.get(name, (None,))[0] == worker_id:
+                del self.leases[name]
+    
+    def holders(self, now):
+        with self.lock:
+            return {name: worker for name, (worker, expires) in self.leases.items() if expires > now}
+
+
+class SqliteLeaseStore:
+    """Leases and worker heartbeats in a SQLite file shared by all workers.
+    
+    Every call is one autocommit statement; acquire is a single upsert
+    that only overwrites free, expired or own leases. By default this is
+    the state database, so a worker taking over an account also resumes
+    from the previous holder's stock state and notification counts.
+    """
+    
+    def __init__(self, path=LEASE_DB_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=LEASE_RENEW_INTERVAL, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS workers (
+                worker_id TEXT PRIMARY KEY,
+                expires REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS leases (
+                account TEXT PRIMARY KEY,
+                worker_id TEXT NOT NULL,
+                expires REAL NOT NULL
+            );
+        """)
+    
+    def heartbeat(self, worker_id, expires):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO workers VALUES (?, ?)", (worker_id, expires))
+            self.conn.execute("DELETE FROM workers WHERE expires < ?", (expires - 2 * LEASE_TTL,))
+    
+    def remove_worker(self, worker_id):
+        with self.lock:
+            self.conn.execute("DELETE FROM workers WHERE worker_id = ?", (worker_id,))
+    
+    def live_workers(self, now):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT worker_id FROM workers WHERE expires > ? ORDER BY worker_id", (now,)
+            ).fetchall()
+        return [worker for worker, in rows]
+    
+    def acquire(self, name, worker_id, expires, now):
+        with self.lock:
+            cursor = self.conn.execute(
+                """
+                INSERT INTO leases VALUES (?, ?, ?)
+                ON CONFLICT (account) DO UPDATE SET worker_id = excluded.worker_id, expires = excluded.expires
+                WHERE leases.worker_id = excluded.worker_id OR leases.expires <= ?
+                """,
+                (name, worker_id, expires, now)
+            )
+            return cursor.rowcount == 1
+    
+    def release(self, name, worker_id):
+        with self.lock:
+            self.conn.execute("DELETE FROM leases WHERE account = ? AND worker_id = ?", (name, worker_id))
+    
+    def holders(self, now):
+        with self.lock:
+            rows = self.conn.execute("SELECT account, worker_id FROM leases WHERE expires > ?", (now,)).fetchall()
+        return dict(rows)
+
+
+def get_lease_store():
+    """Return a lease store selected by LEASE_BACKEND"""
+    if LEASE_BACKEND == "sqlite":
+        return SqliteLeaseStore(LEASE_DB_FILE)
+    return MemoryLeaseStore()
+
+
+class LeaseManager:
+    """Claim this worker's fair share of the accounts and keep the leases alive.
+    
+    Each rebalance() heartbeats the worker, renews its leases, releases
+    any above ceil(accounts / live workers) and claims free or expired
+    leases up to that share. Workers rank accounts by a hash of (worker,
+    account), so they prefer different accounts and a worker joining or
+    dying only moves its own share. A dead worker's leases are taken
+    over once they expire, within LEASE_TTL + LEASE_RENEW_INTERVAL.
+    
+    A lease above the share whose account is still being scanned (the
+    `busy` callback) is drained instead: it stops counting as held, is
+    renewed meanwhile and is released by scan_finished(), so the next
+    holder never loads state the scan hasn't committed yet.
+    """
+    
+    def __init__(self, store, names, worker_id=None):
+        self.store = store
+        self.worker_id = worker_id or WORKER_ID
+        self.preference = sorted(
+            names,
+            key=lambda name: hashlib.blake2b(f"{self.worker_id}\0{name}".encode(), digest_size=8).digest()
+        )
+        self.held = {}  # account name -> lease expiry
+        self.draining = set()  # above the share, released once their scan finishes
+        self.lock = threading.Lock()
+    
+    def holds(self, name, margin=LEASE_SCAN_MARGIN):
+        """True while this worker holds the lease with more than `margin` seconds left"""
+        expires = self.held.get(name)
+        return expires is not None and expires - time.time() > margin
+    
+    def rebalance(self, busy=None):
+        """Renew, release and claim leases; returns (gained, lost) account names.
+        
+        `busy(name)` tells whether the account's scan is in flight; it must
+        see a scan started by anyone who checked holds() before the call.
+        """
+        now = time.time()
+        expires = now + LEASE_TTL
+        self.store.heartbeat(self.worker_id, expires)
+        workers = self.store.live_workers(now)
+        share = math.ceil(len(self.preference) / max(1, len(workers)))
+        holders = self.store.holders(now)
+        
+        previous = dict(self.held)
+        held = {}
+        mine = [name for name in self.preference if holders.get(name) == self.worker_id]
+        surplus = mine[share:]  # least preferred first to go
+        for name in surplus:
+            self.held.pop(name, None)  # no new scans from here on
+        released = []
+        with self.lock:
+            for name in surplus:
+                if busy is not None and busy(name):
+                    if self.store.acquire(name, self.worker_id, expires, now):
+                        self.draining.add(name)
+                    else:
+                        self.draining.discard(name)
+                    continue
+                self.store.release(name, self.worker_id)
+                self.draining.discard(name)
+                released.append(name)
+            for name in mine[:share]:
+                self.draining.discard(name)
+                if self.store.acquire(name, self.worker_id, expires, now):
+                    held[name] = expires
+        for name in self.preference:
+            if len(held) >= share:
+                break
+            if name not in holders and self.store.acquire(name, self.worker_id, expires, now):
+                held[name] = expires
+        
+        gained = [name for name in held if name not in previous]
+        lost = [name for name in previous if name not in held and name not in surplus]
+        self.held = held
+        
+        if gained:
+            LEASE_EVENTS.inc('acquired', amount=len(gained))
+            logger.info(f"🔑 [{self.worker_id}] Acquired {len(gained)} leases ({len(held)}/{share} held, {len(workers)} workers)")
+        if released:
+            LEASE_EVENTS.inc('released', amount=len(released))
+            logger.info(f"📤 [{self.worker_id}] Released {len(released)} leases to rebalance ({len(workers)} workers)")
+        if self.draining:
+            logger.info(f"⏳ [{self.worker_id}] Releasing {len(self.draining)} leases once their scans finish")
+        if lost:
+            LEASE_EVENTS.inc('lost', amount=len(lost))
+            logger.warning(f"⚠️ [{self.worker_id}] Lost {len(lost)} leases: {', '.join(lost)}")
+        return gained, lost
+    
+    def scan_finished(self, name):
+        """Release a draining lease now that its account's scan has committed"""
+        with self.lock:
+            if name not in self.draining:
+                return
+            self.draining.discard(name)
+            try:
+                self.store.release(name, self.worker_id)
+            except sqlite3.Error as e:
+                logger.error(f"❌ Lease store error: {e}")
+                return
+        LEASE_EVENTS.inc('released')
+        logger.info(f"📤 [{self.worker_id}] Released drained lease {name}")
+    
+    def release_all(self):
+        """Hand every lease back and leave the cluster (on shutdown, after scans finished)"""
+        with self.lock:
+            held, self.held = set(self.held) | self.draining, {}
+            self.draining = set()
+        try:
+            for name in held:
+                self.store.release(name, self.worker_id)
+            self.store.remove_worker(self.worker_id)
+        except sqlite3.Error as e:
+            logger.error(f"❌ Lease store error: {e}")
+            return
+        if held:
+            logger.info(f"📤 [{self.worker_id}] Released {len(held)} leases on shutdown")
+
+
+def monitor_accounts(path=ACCOUNTS_FILE, cluster=False):
+    """Monitor every account listed in the accounts file.
+    
+    In cluster mode every worker loads the same file and only scans the
+    accounts it holds a lease for.
+    """
+    accounts = load_accounts(path)
+    if not accounts:
+        logger.error("❌ No accounts to monitor!")
+        return
+    
+    leases = None
+    if cluster:
+        leases = LeaseManager(get_lease_store(), [account.name for account in accounts])
+    
+    for account in accounts:
+        account.username = get_telegram_username(account.chat_id)
+    
+    watcher = ConfigWatcher(accounts)
+    watcher.install_signal_handler()
+    PROFILER.install_signal_handler()
+    start_metrics_server()
+    try:
+        MultiAccountEngine(accounts, watcher=watcher, leases=leases).run()
+    except KeyboardInterrupt:
+        logger.info("\n⏹️  Monitor stopped by user")
+        NOTIFIER.flush(timeout=10)
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SHEIN wishlist monitor")
+    parser.add_argument('--accounts', metavar='FILE', nargs='?', const=ACCOUNTS_FILE,
+                        help=f"monitor every account in FILE (default: {ACCOUNTS_FILE})")
+    parser.add_argument('--cluster', action='store_true',
+                        help="share the --accounts file with other workers via leases (see LEASE_DB_FILE)")
+    parser.add_argument('--worker-id', help="name of this worker in cluster mode (default: WORKER_ID or host-pid)")
+    parser.add_argument('--chat-id', help="Telegram Chat ID (default: USER_CHAT_ID from env)")
+    parser.add_argument('--headless', action='store_true',
+                        help="never prompt; fail fast if the Chat ID is not configured")
+    parser.add_argument('--profile', metavar='SCANS', type=int, nargs='?', const=PROFILE_SCANS,
+                        help=f"profile the first SCANS scans (default: {PROFILE_SCANS}); "
+                             f"later, send SIGUSR1 or create {PROFILE_TRIGGER_FILE}")
+    args = parser.parse_args()
+    if args.profile:
+        PROFILER.request(args.profile)
+    if args.worker_id:
+        WORKER_ID = args.worker_id
+    
     print("""
 ╔══════════════════════════════════════════════════════════════════╗
 ║                                                                  ║
@@ -526,6 +3269,9 @@ if __name__ == "__main__":
     logger.info("🔔 Sends notifications to YOU and ADMIN")
     
     try:
-        monitor_wishlist()
+        if args.accounts or args.cluster:
+            monitor_accounts(args.accounts or ACCOUNTS_FILE, args.cluster)
+        elif monitor_wishlist(args.chat_id, args.headless) is False:
+            sys.exit(1)
     except KeyboardInterrupt:
         logger.info("\n⏹️  Script stopped by user")